@@ -3,7 +3,8 @@ app.py — Interfaccia Streamlit per Souvenir Petit Bellevue
 Tavolo-centrica: 5 tavoli sempre visibili, configurazione ospiti inline.
 """
 
-import io, zipfile, sys
+import io, zipfile, sys, multiprocessing
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
 from datetime import date
 
@@ -15,7 +16,8 @@ ROOT = Path(__file__).resolve().parent
 sys.path.insert(0, str(ROOT / "scripts"))
 
 from genera_souvenir import (
-    genera_souvenir, safe_filename, get_db, set_db, OUTPUT_DIR,
+    genera_serata, genera_parallelo, crea_pool, safe_filename, get_db, set_db,
+    OUTPUT_DIR, VARIANTI,
 )
 from ui_helpers import apply_ui
 
@@ -31,6 +33,14 @@ if _db:
 
 DB = get_db()
 
+
+@st.cache_resource
+def pool_generazione():
+    """Pool di processi condiviso tra i rerun: i worker restano caldi
+    (font, sfondo, separatore) da un click all'altro. "spawn" perché
+    Streamlit è multi-thread e fork non è sicuro."""
+    return crea_pool(mp_context=multiprocessing.get_context("spawn"))
+
 # ── Configurazione tavoli ──
 TAVOLI = [
     ("1pb", 2),
@@ -57,6 +67,10 @@ st.markdown('<p class="title-caption">Generatore souvenir per Le Petit Bellevue<
 with st.sidebar:
     data_serata = st.date_input("Data serata", value=date.today())
     mostra_prezzo = st.checkbox("Mostra prezzi nel souvenir", value=False)
+    serata_unica = st.checkbox("PDF unico per la serata", value=False,
+                               help="Un solo file da stampare: due pagine per ospite")
+    variante = st.selectbox("Sfondo", list(VARIANTI),
+                            help="stampa: piena risoluzione — anteprima: file leggero per email")
     st.divider()
     btn_genera = st.button("Genera tutti i PDF", type="primary", use_container_width=True)
     placeholder_download = st.empty()
@@ -150,32 +164,68 @@ if btn_genera:
     else:
         date_file = data_serata.strftime("%d%m%Y")
         pdfs = []
-        progress = st.progress(0, text="Generazione PDF...")
-
-        for idx, o in enumerate(ordini):
-            fname = f"souvenir_{date_file}_{safe_filename(o['tavolo'])}_{safe_filename(o['nome'])}.pdf"
-            out_path = OUTPUT_DIR / fname
-            label = f"Tavolo {o['tavolo']} - {o['nome']}"
 
+        if serata_unica:
+            # Night book: un solo PDF con sfondo, font e separatore condivisi
+            fname = f"serata_{date_file}.pdf"
             try:
-                pdf_bytes = genera_souvenir(
-                    data_serata, o["tavolo"], o["nome"], o["lingua"],
-                    o["tipo_menu"], o["piatti_csv"], output_path=out_path,
-                    numero_ospite=o["numero_ospite"],
-                    mostra_prezzo=mostra_prezzo,
-                )
+                with st.spinner("Generazione PDF serata..."):
+                    pdf_bytes, esclusi = genera_serata([
+                        dict(data_val=data_serata, tavolo=o["tavolo"], ospite=o["nome"],
+                             lingua=o["lingua"], tipo_menu=o["tipo_menu"],
+                             piatti_csv=o["piatti_csv"], numero_ospite=o["numero_ospite"],
+                             mostra_prezzo=mostra_prezzo)
+                        for o in ordini
+                    ], output_path=OUTPUT_DIR / fname, variante=variante)
+                for idx in esclusi:
+                    st.error(f"Tavolo {ordini[idx]['tavolo']} - {ordini[idx]['nome']}: "
+                             f"generazione fallita (nessun output)")
                 if pdf_bytes:
-                    pdfs.append((label, fname, pdf_bytes))
-                else:
-                    st.error(f"{label}: generazione fallita (nessun output)")
+                    n_ok = len(ordini) - len(esclusi)
+                    pdfs.append((f"Serata ({n_ok} ospiti)", fname, pdf_bytes))
+                    st.success(f"PDF serata generato: {n_ok} ospiti")
             except Exception as e:
-                st.error(f"{label}: {e}")
-
-            progress.progress((idx + 1) / len(ordini), text=f"{label}...")
-
-        progress.empty()
-        st.session_state.pdfs = pdfs
-        st.success(f"{len(pdfs)} PDF generati!")
+                st.error(f"Serata: {e}")
+            st.session_state.pdfs = pdfs
+
+        else:
+            progress = st.progress(0, text="Generazione PDF...")
+
+            # Ogni ospite va a un worker; la barra avanza man mano che finiscono
+            richieste = []
+            for o in ordini:
+                fname = f"souvenir_{date_file}_{safe_filename(o['tavolo'])}_{safe_filename(o['nome'])}.pdf"
+                richieste.append((f"Tavolo {o['tavolo']} - {o['nome']}", fname, dict(
+                    data_val=data_serata, tavolo=o["tavolo"], ospite=o["nome"],
+                    lingua=o["lingua"], tipo_menu=o["tipo_menu"],
+                    piatti_csv=o["piatti_csv"], numero_ospite=o["numero_ospite"],
+                    mostra_prezzo=mostra_prezzo)))
+
+            generati = {}
+            try:
+                esiti = genera_parallelo([r[2] for r in richieste], variante=variante,
+                                         pool=pool_generazione())
+                for n, esito in enumerate(esiti, 1):
+                    label, fname, _ = richieste[esito["indice"]]
+                    if esito["ok"]:
+                        out_path = OUTPUT_DIR / fname
+                        out_path.parent.mkdir(parents=True, exist_ok=True)
+                        out_path.write_bytes(esito["pdf"])
+                        generati[esito["indice"]] = (label, fname, esito["pdf"])
+                    else:
+                        st.error(f"{label}: {esito['errore']}")
+                    progress.progress(n / len(richieste), text=f"{label}...")
+            except BrokenProcessPool:
+                # Un worker è morto: il pool va chiuso e ricreato al prossimo click
+                pool_generazione().shutdown(wait=False, cancel_futures=True)
+                pool_generazione.clear()
+                st.error("Generazione interrotta (processo di lavoro terminato): riprovare.")
+
+            # Tabs nell'ordine dei tavoli, non in quello di completamento
+            pdfs = [generati[i] for i in sorted(generati)]
+            progress.empty()
+            st.session_state.pdfs = pdfs
+            st.success(f"{len(pdfs)} PDF generati!")
 
 # ══════════════════════════════════════════════════════════════
 # ANTEPRIMA E DOWNLOAD
@@ -0,0 +1,131 @@
+"""
+cache_souvenir.py — Cache content-addressed dei PDF souvenir generati.
+La chiave è l'hash di tutti gli input che finiscono nel PDF più le versioni
+di DB, sfondo e codice: input identici → stesso PDF, servito senza rigenerare.
+In memoria con eviction LRU; opzionalmente anche su disco (output/.cache/).
+"""
+
+import hashlib
+import json
+import os
+import uuid
+import zipfile
+from collections import OrderedDict
+from pathlib import Path
+
+_IMPRONTE_FILE = {}  # (path, mtime_ns, size) -> sha256
+
+
+def impronta_file(path):
+    """SHA-256 del contenuto di un file (ricalcolato solo se il file cambia)."""
+    path = Path(path)
+    st = path.stat()
+    k = (str(path), st.st_mtime_ns, st.st_size)
+    if k not in _IMPRONTE_FILE:
+        _IMPRONTE_FILE[k] = hashlib.sha256(path.read_bytes()).hexdigest()
+    return _IMPRONTE_FILE[k]
+
+def scrivi_atomico(path, data):
+    """Scrive `data` (bytes) in `path` passando da un file temporaneo con
+    nome unico (pid + uuid): più processi possono scrivere lo stesso file
+    insieme e chi legge vede sempre un file completo (il vecchio o il nuovo)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp, "xb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+def sidecar(path, carica, costruisci, serializza=bytes, forza=False):
+    """Valore salvato in un file accanto agli asset (profili, zone,
+    separatore), ricostruito solo se serve.
+
+    `carica(data)` ricava il valore dai bytes del file e ritorna None se il
+    file è di un'altra versione (chiave diversa): in quel caso, o se il file
+    è illeggibile o troncato, il valore viene ricostruito con `costruisci()`
+    e salvato come `serializza(valore)` (scrittura atomica). Una cartella
+    non scrivibile non è un errore: si ricostruisce al prossimo avvio.
+    Ritorna (valore, True se letto dal file)."""
+    path = Path(path)
+    if not forza and path.exists():
+        try:
+            valore = carica(path.read_bytes())
+            if valore is not None:
+                return valore, True
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            pass  # file illeggibile o troncato: si ricostruisce
+    valore = costruisci()
+    try:
+        scrivi_atomico(path, serializza(valore))
+    except OSError:
+        pass  # cartella non scrivibile
+    return valore, False
+
+def impronta_dati(obj):
+    """SHA-256 di una struttura JSON-serializzabile (chiavi ordinate)."""
+    raw = json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CacheSouvenir:
+    """Cache LRU chiave → PDF bytes, limitata per numero di voci e byte totali.
+
+    Con `cartella` impostata ogni PDF viene anche salvato come <chiave>.pdf
+    e riletto da lì quando non è (più) in memoria."""
+
+    def __init__(self, max_voci=64, max_bytes=256 * 1024 * 1024, cartella=None):
+        self.max_voci = max_voci
+        self.max_bytes = max_bytes
+        self.cartella = Path(cartella) if cartella else None
+        self._voci = OrderedDict()
+        self._bytes = 0
+        self.hit = 0
+        self.miss = 0
+
+    def get(self, chiave):
+        """Ritorna i bytes del PDF per `chiave`, None se assente."""
+        if chiave in self._voci:
+            self._voci.move_to_end(chiave)
+            self.hit += 1
+            return self._voci[chiave]
+        if self.cartella is not None:
+            path = self.cartella / f"{chiave}.pdf"
+            if path.exists():
+                data = path.read_bytes()
+                self._memorizza(chiave, data)
+                self.hit += 1
+                return data
+        self.miss += 1
+        return None
+
+    def put(self, chiave, data):
+        """Salva il PDF in memoria (e su disco se configurato). Un errore di
+        scrittura su disco non è fatale: la voce resta solo in memoria."""
+        self._memorizza(chiave, data)
+        if self.cartella is not None:
+            try:
+                scrivi_atomico(self.cartella / f"{chiave}.pdf", data)
+            except OSError:
+                pass  # cartella non scrivibile: al prossimo avvio sarà un miss
+
+    def svuota(self):
+        """Svuota la cache in memoria (i file su disco restano)."""
+        self._voci.clear()
+        self._bytes = 0
+
+    def _memorizza(self, chiave, data):
+        if chiave in self._voci:
+            self._bytes -= len(self._voci.pop(chiave))
+        self._voci[chiave] = data
+        self._bytes += len(data)
+        while self._voci and (len(self._voci) > self.max_voci
+                              or self._bytes > self.max_bytes):
+            _, vecchio = self._voci.popitem(last=False)
+            self._bytes -= len(vecchio)
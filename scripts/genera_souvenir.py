@@ -4,19 +4,28 @@ Legge ordini da file Excel (input/*.xlsx), genera un PDF per ogni ospite.
 Font, spaziature e zone proibite dall'analisi pixel degli originali.
 """
 
-import sys, io, json, re
+import sys, io, os, json, math, re, time, logging, threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime, date
 
 from reportlab.pdfgen.canvas import Canvas
-from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase import pdfmetrics, pdfdoc
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.utils import simpleSplit, ImageReader
-from pypdf import PdfReader, PdfWriter
-import fitz
-from PIL import Image
-import numpy as np
-import openpyxl
+
+from sfondo import (
+    SfondoCondiviso, VARIANTI, VARIANTI_DIR, carica_sfondo, dimensioni_pagina,
+    risolvi_variante,
+)
+from cache_souvenir import CacheSouvenir, impronta_dati, impronta_file, sidecar
+from misure_testo import larghezza, misura_parole
+
+# Diagnostica: INFO = una riga per ospite, DEBUG = report per elemento.
+# Senza configurazione (app) passano solo avvisi ed errori.
+log = logging.getLogger("souvenir")
 
 # ══════════════════════════════════════════════════════════════
 # PERCORSI
@@ -29,22 +38,25 @@ DB_FILE    = ROOT / "database" / "menu_database.json"
 FONTS_DIR  = ROOT / "assets" / "fonts"
 
 # ══════════════════════════════════════════════════════════════
-# FONT
+# FONT — registrati al primo uso (vedi prepara())
 # ══════════════════════════════════════════════════════════════
-pdfmetrics.registerFont(TTFont("Bellevue",        str(ROOT / "assets" / "Bellevue.ttf")))
-pdfmetrics.registerFont(TTFont("BernhardMod",     str(FONTS_DIR / "Bernhard Modern BT.ttf")))
-pdfmetrics.registerFont(TTFont("BernhardMod-It",  str(FONTS_DIR / "Bernhard Modern Italic BT.ttf")))
-pdfmetrics.registerFont(TTFont("BernhardMod-Bd",  str(FONTS_DIR / "Bernhard Modern Bold BT.ttf")))
-pdfmetrics.registerFont(TTFont("BernhardMod-BdIt",str(FONTS_DIR / "Bernhard Modern Bold Italic BT.ttf")))
-print(f"Font caricati da: {FONTS_DIR}")
-print("Font registrati OK")
+FONT_FILES = {
+    "Bellevue":         ROOT / "assets" / "Bellevue.ttf",
+    "BernhardMod":      FONTS_DIR / "Bernhard Modern BT.ttf",
+    "BernhardMod-It":   FONTS_DIR / "Bernhard Modern Italic BT.ttf",
+    "BernhardMod-Bd":   FONTS_DIR / "Bernhard Modern Bold BT.ttf",
+    "BernhardMod-BdIt": FONTS_DIR / "Bernhard Modern Bold Italic BT.ttf",
+}
+
+def _registra_font():
+    for nome, path in FONT_FILES.items():
+        pdfmetrics.registerFont(TTFont(nome, str(path)))
+    log.debug("Font registrati da: %s", FONTS_DIR)
 
 # ══════════════════════════════════════════════════════════════
 # DIMENSIONI PAGINA (A4 landscape)
 # ══════════════════════════════════════════════════════════════
-_bg_ref = PdfReader(str(SFONDO))
-pw   = float(_bg_ref.pages[0].mediabox.width)   # 841.89 pt
-ph   = float(_bg_ref.pages[0].mediabox.height)  # 595.28 pt
+pw, ph = dimensioni_pagina(SFONDO)   # 841.89 x 595.28 pt — solo MediaBox, sfondo al primo uso
 half = pw / 2                                     # 420.95 pt — asse di piega
 
 # ══════════════════════════════════════════════════════════════
@@ -127,49 +139,204 @@ _RIGHT_DECO_PROFILE = [
    841,841,841,841,841,841,841,841,841,841,841,841,841,841,841,841,841,841,841,841,
 ]
 
+# Le tabelle qui sopra valgono per lo sfondo della scansione di feb 2026;
+# per qualsiasi altro sfondo i profili sono estratti da profili_deco.py
+# (PyMuPDF) e letti dal file sidecar in assets/sfondo/, keyed per hash.
+_SHA_SFONDO_SCANSIONE = "f784c339ffec0318ef3e30fba8824ad56595c316c363b5c9b107ed225bbaecb3"
+DECO_PASSO = 1.0  # pt per riga dei profili estratti (< 1 = sotto il punto)
+
+@lru_cache(maxsize=None)
+def profili_decorazione():
+    """(sinistra, destra, passo) dei profili di pagina 2 per SFONDO."""
+    if DECO_PASSO == 1.0 and impronta_file(SFONDO) == _SHA_SFONDO_SCANSIONE:
+        return _LEFT_DECO_PROFILE, _RIGHT_DECO_PROFILE, 1.0
+    from profili_deco import profili_sfondo
+    try:
+        dati = profili_sfondo(SFONDO, passo=DECO_PASSO)
+    except ImportError:
+        log.warning("PyMuPDF non disponibile: profili decorazioni della "
+                    "scansione feb 2026 (sfondo diverso!)")
+        return _LEFT_DECO_PROFILE, _RIGHT_DECO_PROFILE, 1.0
+    log.debug("Profili decorazioni: %s righe da %g pt (%s)",
+              len(dati["sinistra"]), dati["passo"], SFONDO.name)
+    return dati["sinistra"], dati["destra"], dati["passo"]
+
+_SAFE_BUF = int(SAFETY) + 1  # righe scansionate sopra/sotto Y (±SAFETY pt)
+
+class IndiceIntervalli:
+    """Sparse table su un profilo: riduzione (max o min) di qualsiasi
+    intervallo di righe [lo, hi] in O(1), dopo una costruzione O(n log n)."""
+
+    def __init__(self, valori, riduci):
+        import numpy as np
+        livelli = [np.asarray(valori, dtype=np.float64)]
+        passo = 1
+        while 2 * passo <= len(livelli[0]):
+            prec = livelli[-1]
+            livelli.append(riduci(prec[:-passo], prec[passo:]))
+            passo *= 2
+        self._livelli = [l.tolist() for l in livelli]
+        self._riduci = max if riduci is np.maximum else min
+        self.n = len(valori)
+        # Stessi livelli come matrice (righe corte completate con il neutro)
+        # per le query vettoriali
+        self._ufunc = riduci
+        self._neutro = -np.inf if riduci is np.maximum else np.inf
+        self._tabella = np.full((len(livelli), self.n), self._neutro)
+        for k, l in enumerate(livelli):
+            self._tabella[k, :len(l)] = l
+
+    def query(self, lo, hi):
+        """Riduzione su [lo, hi] (estremi inclusi, clippati al profilo);
+        None se l'intervallo non interseca il profilo."""
+        lo, hi = max(lo, 0), min(hi, self.n - 1)
+        if lo > hi:
+            return None
+        k = (hi - lo + 1).bit_length() - 1
+        livello = self._livelli[k]
+        return self._riduci(livello[lo], livello[hi - (1 << k) + 1])
+
+    def query_array(self, lo, hi):
+        """query() su array di intervalli; ±inf (neutro) dove l'intervallo
+        non interseca il profilo."""
+        import numpy as np
+        lo = np.maximum(lo, 0)
+        hi = np.minimum(hi, self.n - 1)
+        vuoto = lo > hi
+        lo = np.where(vuoto, 0, lo)
+        hi = np.where(vuoto, 0, hi)
+        k = np.frexp(hi - lo + 1)[1] - 1  # floor(log2(lunghezza))
+        ris = self._ufunc(self._tabella[k, lo],
+                          self._tabella[k, hi - np.left_shift(1, k) + 1])
+        ris[vuoto] = self._neutro
+        return ris
+
+@lru_cache(maxsize=None)
+def _indici_decorazioni():
+    """Indici per intervalli sui profili: max di deco+SAFETY a sinistra,
+    min di deco-SAFETY a destra (±inf dove non c'è decorazione)."""
+    import numpy as np
+    sinistra, destra, passo = profili_decorazione()
+    left = np.asarray(sinistra, dtype=np.float64)
+    right = np.asarray(destra, dtype=np.float64)
+    return (IndiceIntervalli(np.where(left > 0, left + SAFETY, -np.inf), np.maximum),
+            IndiceIntervalli(np.where(right < int(pw), right - SAFETY, np.inf), np.minimum),
+            passo)
+
+def _righe(y_lo, y_hi, passo):
+    """Righe del profilo che coprono [y_lo, y_hi] pt."""
+    if passo == 1.0:
+        return int(y_lo), int(y_hi)
+    return math.floor(y_lo / passo), math.ceil(y_hi / passo)
+
+def margine_sx_intervallo(y_lo, y_hi):
+    """Margine sinistro sicuro per tutte le Y in [y_lo, y_hi] pt
+    (0 se nessuna decorazione)."""
+    sx, _, passo = _indici_decorazioni()
+    m = sx.query(*_righe(y_lo, y_hi, passo))
+    return 0 if m is None or m == float("-inf") else m
+
+def margine_dx_intervallo(y_lo, y_hi):
+    """Margine destro sicuro per tutte le Y in [y_lo, y_hi] pt
+    (None se nessuna decorazione)."""
+    _, dx, passo = _indici_decorazioni()
+    m = dx.query(*_righe(y_lo, y_hi, passo))
+    return None if m is None or m == float("inf") else m
+
+def margini_intervalli(y_lo, y_hi):
+    """margine_sx/dx_intervallo su array di intervalli (pt interi):
+    ritorna (sx, dx) con 0 / pw dove non c'è decorazione."""
+    import numpy as np
+    sx, dx, passo = _indici_decorazioni()
+    if passo != 1.0:
+        y_lo, y_hi = np.floor(y_lo / passo), np.ceil(y_hi / passo)
+    y_lo, y_hi = np.asarray(y_lo, dtype=np.int64), np.asarray(y_hi, dtype=np.int64)
+    m_sx = sx.query_array(y_lo, y_hi)
+    m_dx = dx.query_array(y_lo, y_hi)
+    return (np.where(m_sx == -np.inf, 0.0, m_sx),
+            np.where(m_dx == np.inf, pw, m_dx))
+
+@lru_cache(maxsize=None)
+def _margini_dilatati():
+    """Margini per ogni Y intera in [-_SAFE_BUF, altezza+_SAFE_BUF] (indice
+    Y + _SAFE_BUF), calcolati una volta dall'indice per intervalli sulla
+    finestra Y ± _SAFE_BUF: sx (0 se nessuna decorazione), dx (pw se nessuna)."""
+    import numpy as np
+    righe = np.arange(-_SAFE_BUF, int(ph) + _SAFE_BUF + 2)
+    return margini_intervalli(righe - _SAFE_BUF, righe + _SAFE_BUF)
+
 def get_left_safe_margin(rl_y):
     """Ritorna il margine sinistro sicuro per una data coordinata Y.
-    Scansiona ±SAFETY pt attorno a Y per catturare decorazioni vicine."""
-    margin = 0
-    yc = int(round(rl_y))
-    buf = int(SAFETY) + 1
-    for yi in range(max(0, yc - buf), min(len(_LEFT_DECO_PROFILE), yc + buf + 1)):
-        deco = _LEFT_DECO_PROFILE[yi]
-        if deco > 0:
-            margin = max(margin, deco + SAFETY)
-    return margin
+    Considera ±SAFETY pt attorno a Y per catturare decorazioni vicine."""
+    sx = _margini_dilatati()[0]
+    k = int(round(rl_y)) + _SAFE_BUF
+    return float(sx[k]) if 0 <= k < len(sx) else 0
 
 def get_right_safe_margin(rl_y):
     """Ritorna il margine destro sicuro per una data coordinata Y.
-    Scansiona ±SAFETY pt attorno a Y per catturare decorazioni vicine."""
-    limit = pw
-    yc = int(round(rl_y))
-    buf = int(SAFETY) + 1
-    for yi in range(max(0, yc - buf), min(len(_RIGHT_DECO_PROFILE), yc + buf + 1)):
-        deco = _RIGHT_DECO_PROFILE[yi]
-        if deco < 841:
-            limit = min(limit, deco - SAFETY)
-    return limit
+    Considera ±SAFETY pt attorno a Y per catturare decorazioni vicine."""
+    dx = _margini_dilatati()[1]
+    k = int(round(rl_y)) + _SAFE_BUF
+    return float(dx[k]) if 0 <= k < len(dx) else pw
+
+@lru_cache(maxsize=None)
+def estensione_font(font, size):
+    """(ascent, descent) in pt del font registrato a corpo `size`."""
+    face = pdfmetrics.getFont(font).face
+    return (face.ascent / face.unitsPerEm * size,
+            abs(face.descent) / face.unitsPerEm * size)
+
+def margini_per_estensione(y_baseline, ascent, descent):
+    """get_safe_margin_for_extent vettoriale: per array di baseline e
+    relativa estensione verticale ritorna (margini sx, margini dx)."""
+    import numpy as np
+    y_lo = np.rint(y_baseline - descent).astype(np.int64) - _SAFE_BUF
+    y_hi = np.rint(y_baseline + ascent).astype(np.int64) + _SAFE_BUF
+    return margini_intervalli(y_lo, y_hi)
 
 def get_safe_margin_for_extent(y_baseline, font, size, side):
     """Margine sicuro considerando l'INTERA estensione verticale del testo.
 
-    Controlla 3 punti Y (baseline, ascent, descent) e prende il margine
-    più restrittivo — così nessun pixel del testo può entrare nelle zone.
+    Tutte le righe da descent ad ascent, ±SAFETY, in una sola query
+    sull'indice per intervalli: nessun pixel del testo può entrare nelle
+    zone, nemmeno tra un punto campione e l'altro.
     """
-    face = pdfmetrics.getFont(font).face
-    ascent = face.ascent / face.unitsPerEm * size
-    descent = abs(face.descent) / face.unitsPerEm * size
-    y_top = y_baseline + ascent
-    y_bottom = y_baseline - descent
+    ascent, descent = estensione_font(font, size)
+    y_lo = int(round(y_baseline - descent)) - _SAFE_BUF
+    y_hi = int(round(y_baseline + ascent)) + _SAFE_BUF
     if side == "left":
-        return max(get_left_safe_margin(y_baseline),
-                   get_left_safe_margin(y_top),
-                   get_left_safe_margin(y_bottom))
+        return margine_sx_intervallo(y_lo, y_hi)
     else:
-        return min(get_right_safe_margin(y_baseline),
-                   get_right_safe_margin(y_top),
-                   get_right_safe_margin(y_bottom))
+        m = margine_dx_intervallo(y_lo, y_hi)
+        return pw if m is None else m
+
+# ══════════════════════════════════════════════════════════════
+# ZONE OCCUPATE 2D — entrambe le pagine (zone_sfondo.py)
+# Griglia di occupazione dello sfondo con immagine integrale:
+# "rettangolo libero?" in O(1) per qualsiasi elemento.
+# ══════════════════════════════════════════════════════════════
+ZONE_CELLA = 1.0  # pt per cella
+
+@lru_cache(maxsize=None)
+def mappa_zone(pagina, coperture=()):
+    """MappaOccupazione della pagina `pagina` di SFONDO, con le celle sotto
+    i rettangoli `coperture` liberate. None se PyMuPDF non è disponibile."""
+    if coperture:
+        base = mappa_zone(pagina)
+        return base.senza(coperture) if base is not None else None
+    try:
+        from zone_sfondo import mappa_sfondo
+    except ImportError:
+        log.warning("PyMuPDF non disponibile: controllo zone 2D disattivato")
+        return None
+    return mappa_sfondo(SFONDO, pagina, cella=ZONE_CELLA)
+
+def zona_libera(pagina, x0, y0, x1, y1, margine=0.0, coperture=()):
+    """True se il rettangolo (pt reportlab) sulla pagina `pagina` (0 = copertina)
+    non tocca decorazioni dello sfondo, escluse quelle sotto `coperture`.
+    Senza mappa disponibile ritorna sempre True."""
+    mappa = mappa_zone(pagina, tuple(coperture))
+    return mappa is None or mappa.libero(x0, y0, x1, y1, margine)
 
 # ══════════════════════════════════════════════════════════════
 # COSTANTI POSIZIONAMENTO — PAGINA 1 (copertina)
@@ -243,104 +410,306 @@ CLR_WINE_TITLE     = (56/255, 42/255, 102/255)    # RGB(56,42,102) viola scuro
 WINE_TITLE_OPACITY = 0.6
 WINE_TITLE_SIZE    = 48
 
+RULED_LINE_WIDTH   = 0.75   # righe per scrittura a mano (metà destra)
+
 # Piatti — font e dimensioni dall'analisi pixel di Souvenir Menu Esprit.pdf
 CLR_DISH_NAME = (0.30, 0.22, 0.16)   # bruno scuro
 CLR_DESC      = (0.42, 0.36, 0.30)   # bruno medio
 SZ_DISH_NAME  = 20                    # Bernhard Modern Regular (dall'originale)
 SZ_DESC       = 14                    # Bernhard Modern Italic (dall'originale)
 
+# Auto-fit: se il layout dei piatti va in abort, caratteri, interlinee e gap
+# vengono ridotti (ricerca binaria sulla scala) fino a far passare il
+# controllo zone, senza scendere sotto i corpi minimi
+AUTOFIT             = True
+AUTOFIT_SZ_MIN_NOME = 16              # pt (SZ_DISH_NAME 20)
+AUTOFIT_SZ_MIN_DESC = 11              # pt (SZ_DESC 14)
+AUTOFIT_PASSI       = 6               # passi di bisezione (scala al ~0.3%)
+
 # Separatore — immagine originale (Riga rossa.pdf) ricolorata
-SEP_SRC     = ROOT / "Riga rossa.pdf"
+SEP_SRC     = risolvi_variante(ROOT / "Riga rossa.pdf", "stampa")
 SEP_DRAW_W  = 155                         # larghezza pt (dall'originale: ~37% metà pagina)
 SEP_CLR     = (247, 195, 211)             # RGB target
 SEP_OPACITY = 1.0                         # opacità massima (100%)
 
-# Render PDF sorgente e ricolora
-_doc = fitz.open(str(SEP_SRC))
-_pix = _doc[0].get_pixmap(matrix=fitz.Matrix(4, 4))
-_rgb = Image.frombytes("RGB", [_pix.width, _pix.height], _pix.samples)
-_doc.close()
-
-_arr = np.array(_rgb, dtype=np.float32)
-# Maschera dalla distanza dal bianco (preserva antialiasing)
-_mask = (255.0 - _arr.min(axis=2)) / 255.0
-# Normalizza al valore massimo → nucleo della linea a 100% opacità
-_mask_max = _mask.max()
-if _mask_max > 0:
-    _mask = _mask / _mask_max
-_alpha = (_mask * SEP_OPACITY * 255).clip(0, 255).astype(np.uint8)
-
-# Immagine RGBA con colore target e opacità
-_result = np.zeros((_pix.height, _pix.width, 4), dtype=np.uint8)
-_result[:, :, 0] = SEP_CLR[0]
-_result[:, :, 1] = SEP_CLR[1]
-_result[:, :, 2] = SEP_CLR[2]
-_result[:, :, 3] = _alpha
-
-_sep_pil = Image.fromarray(_result, "RGBA")
-SEP_BUF = io.BytesIO()
-_sep_pil.save(SEP_BUF, format="PNG")
-SEP_BUF.seek(0)
-SEP_READER = ImageReader(SEP_BUF)
-SEP_ASPECT = _pix.width / _pix.height
+SEP_SCALA   = 4                           # rasterizzazione del PDF sorgente (4x)
+SEP_CACHE_DIR = VARIANTI_DIR              # PNG ricolorato / tracciato, generati e riusati
+# Modo di disegno: "vettoriale" = Form XObject tracciato, scritto una volta
+# per documento e scalato con una trasformazione; "immagine" = PNG RGBA.
+SEP_MODO    = "vettoriale"
+SEP_LIVELLI = 8                           # livelli di opacità del tracciato
+
+def _render_separatore():
+    """Rasterizza Riga rossa.pdf e lo ricolora: ritorna il PNG RGBA (bytes)."""
+    import fitz
+    import numpy as np
+    from PIL import Image
+
+    # Render PDF sorgente e ricolora
+    doc = fitz.open(str(SEP_SRC))
+    pix = doc[0].get_pixmap(matrix=fitz.Matrix(SEP_SCALA, SEP_SCALA))
+    rgb = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+    doc.close()
+
+    arr = np.array(rgb, dtype=np.float32)
+    # Maschera dalla distanza dal bianco (preserva antialiasing)
+    mask = (255.0 - arr.min(axis=2)) / 255.0
+    # Normalizza al valore massimo → nucleo della linea a 100% opacità
+    mask_max = mask.max()
+    if mask_max > 0:
+        mask = mask / mask_max
+    alpha = (mask * SEP_OPACITY * 255).clip(0, 255).astype(np.uint8)
+
+    # Immagine RGBA con colore target e opacità
+    result = np.zeros((pix.height, pix.width, 4), dtype=np.uint8)
+    result[:, :, 0] = SEP_CLR[0]
+    result[:, :, 1] = SEP_CLR[1]
+    result[:, :, 2] = SEP_CLR[2]
+    result[:, :, 3] = alpha
+
+    buf = io.BytesIO()
+    Image.fromarray(result, "RGBA").save(buf, format="PNG")
+    return buf.getvalue()
+
+def _chiave_separatore():
+    """Hash di PDF sorgente + colore + opacità + scala (nome dei file in cache)."""
+    return impronta_dati([impronta_file(SEP_SRC), SEP_CLR, SEP_OPACITY, SEP_SCALA])[:16]
+
+def _carica_png(data):
+    """PNG dalla cache su disco, decodificato per intero (troncato → errore)."""
+    from PIL import Image
+    Image.open(io.BytesIO(data)).load()
+    return data
+
+@lru_cache(maxsize=None)
+def _png_separatore():
+    """PNG RGBA del separatore ricolorato (bytes), dalla cache su disco:
+    rigenerato solo se cambiano PDF sorgente, colore, opacità o scala."""
+    png, da_cache = sidecar(
+        SEP_CACHE_DIR / f"separatore-{_chiave_separatore()}.png",
+        _carica_png, _render_separatore)
+    log.debug("Separatore: %s ricolorato RGB%s al %.0f%%, larghezza=%spt (%s)",
+              SEP_SRC.name, SEP_CLR, SEP_OPACITY * 100, SEP_DRAW_W,
+              "dalla cache" if da_cache else f"render {SEP_SCALA}x")
+    return png
+
+@lru_cache(maxsize=None)
+def separatore():
+    """Separatore come immagine: (ImageReader PNG RGBA, rapporto larghezza/altezza)."""
+    reader = ImageReader(io.BytesIO(_png_separatore()))
+    w, h = reader.getSize()
+    return reader, w / h
+
+def _traccia_separatore():
+    """Vettorializza l'alpha del PNG: rettangoli pixel raggruppati per livello
+    di opacità (SEP_LIVELLI), fusi in verticale quando si ripetono identici.
+    Ritorna il dict {larghezza, altezza, livelli, contenuto}."""
+    import numpy as np
+    from PIL import Image
+
+    alpha = np.array(Image.open(io.BytesIO(_png_separatore())).convert("RGBA"))[:, :, 3]
+    h, w = alpha.shape
+    livelli = np.rint(alpha.astype(np.float64) * SEP_LIVELLI / 255).astype(np.int64)
+
+    rettangoli = []  # (x0, x1, livello, riga_inizio, riga_fine)
+    aperti = {}      # (x0, x1, livello) -> riga di inizio
+    for y in range(h + 1):
+        runs = set()
+        if y < h:
+            riga = livelli[y]
+            bordi = np.flatnonzero(np.diff(np.r_[0, riga, 0]))
+            runs = {(int(x0), int(x1), int(riga[x0]))
+                    for x0, x1 in zip(bordi[:-1], bordi[1:]) if riga[x0] > 0}
+        for k in [k for k in aperti if k not in runs]:
+            rettangoli.append((*k, aperti.pop(k), y))
+        for k in runs:
+            aperti.setdefault(k, y)
+
+    ops = ["%.4f %.4f %.4f rg" % tuple(v / 255 for v in SEP_CLR)]
+    for lv in range(1, SEP_LIVELLI + 1):
+        rs = sorted(r for r in rettangoli if r[2] == lv)
+        if rs:
+            ops.append(f"/GS{lv} gs")
+            ops += [f"{x0} {h - y1} {x1 - x0} {y1 - y0} re" for x0, x1, _, y0, y1 in rs]
+            ops.append("f")
+    return {"larghezza": w, "altezza": h, "livelli": SEP_LIVELLI,
+            "contenuto": "\n".join(ops)}
+
+@lru_cache(maxsize=None)
+def separatore_vettoriale():
+    """Separatore tracciato: {larghezza, altezza, livelli, contenuto} con
+    il content stream in unità pixel. Cache su disco accanto al PNG."""
+    v, _ = sidecar(
+        SEP_CACHE_DIR / f"separatore-{_chiave_separatore()}-{SEP_LIVELLI}.json",
+        json.loads, _traccia_separatore, lambda v: json.dumps(v).encode("utf-8"))
+    return v
+
+def aspetto_separatore():
+    """Rapporto larghezza/altezza del separatore (identico nei due modi)."""
+    if SEP_MODO == "vettoriale":
+        v = separatore_vettoriale()
+        return v["larghezza"] / v["altezza"]
+    return separatore()[1]
+
+def _form_separatore(c):
+    """Nome del Form XObject del separatore nel documento di `c`:
+    registrato al primo uso, poi riusato da tutte le pagine."""
+    nome = "SeparatoreSouvenir"
+    doc = c._doc
+    if not doc.hasForm(nome):
+        v = separatore_vettoriale()
+        gs = pdfdoc.PDFDictionary({
+            f"GS{lv}": pdfdoc.PDFDictionary({"Type": pdfdoc.PDFName("ExtGState"),
+                                             "ca": round(lv / v["livelli"], 4)})
+            for lv in range(1, v["livelli"] + 1)
+        })
+        d = pdfdoc.PDFDictionary({
+            "Type": pdfdoc.PDFName("XObject"),
+            "Subtype": pdfdoc.PDFName("Form"),
+            "BBox": pdfdoc.PDFArray([0, 0, v["larghezza"], v["altezza"]]),
+            "Resources": pdfdoc.PDFDictionary({"ExtGState": gs}),
+        })
+        doc.Reference(pdfdoc.PDFStream(d, v["contenuto"].encode("ascii"),
+                                       filters=[pdfdoc.PDFZCompress]),
+                      doc.getXObjectName(nome))
+    return nome
+
+def disegna_separatore(c, x, y, w, h):
+    """Disegna il separatore nel rettangolo (x, y, w, h): nel modo
+    vettoriale un accorciamento è solo una scala diversa del form."""
+    if SEP_MODO == "vettoriale":
+        v = separatore_vettoriale()
+        nome = _form_separatore(c)
+        c.saveState()
+        c.transform(w / v["larghezza"], 0, 0, h / v["altezza"], x, y)
+        c.doForm(nome)
+        c.restoreState()
+    else:
+        c.drawImage(separatore()[0], x, y, width=w, height=h, mask="auto")
 
 # ══════════════════════════════════════════════════════════════
 # METRICHE FONT — per spaziature precise
+# Calcolate da prepara() dopo la registrazione dei font.
 # ══════════════════════════════════════════════════════════════
-name_face = pdfmetrics.getFont("BernhardMod").face
-desc_face = pdfmetrics.getFont("BernhardMod-It").face
-
-name_ascent  = name_face.ascent  / name_face.unitsPerEm * SZ_DISH_NAME
-name_descent = abs(name_face.descent) / name_face.unitsPerEm * SZ_DISH_NAME
-desc_ascent  = desc_face.ascent  / desc_face.unitsPerEm * SZ_DESC
-desc_descent = abs(desc_face.descent) / desc_face.unitsPerEm * SZ_DESC
-
-# Cap height (altezza maiuscole) per centraggio separatore
-try:
-    name_cap_h = name_face.capHeight / name_face.unitsPerEm * SZ_DISH_NAME
-except AttributeError:
-    name_cap_h = name_ascent
-try:
-    desc_cap_h = desc_face.capHeight / desc_face.unitsPerEm * SZ_DESC
-except AttributeError:
-    desc_cap_h = desc_ascent
-
-# Interlinea (tra righe dello stesso elemento, es. nome che va a capo)
-name_lh = SZ_DISH_NAME * 1.3   # 26 pt
-desc_lh = SZ_DESC * 1.3         # 18.2 pt
 
 # Distanza baseline-to-baseline da ultima riga nome a prima riga descrizione.
 VISUAL_GAP_NAME_DESC = 12.5
-NAME_DESC_BL = VISUAL_GAP_NAME_DESC + name_descent + desc_ascent
-
-# Gap standard tra blocchi: riferimento da 7 piatti tipici (~54pt).
-# Usato come tetto massimo per evitare gap enormi con pochi piatti.
-_ref_avail = P2_DISHES_START_Y - P2_DISHES_END_Y
-DISH_STD_GAP = (_ref_avail - 7 * NAME_DESC_BL) / 6
 
-# Baseline data copertina (costante, indipendente dal contenuto)
-date_face = pdfmetrics.getFont(DATE_FONT).face
-date_cap_h = (date_face.ascent / date_face.unitsPerEm) * DATE_SIZE
-_gap_mid = (P1_OVAL_BOTTOM_Y + P1_ITALIC_TOP_Y) / 2
-DATE_BASELINE = _gap_mid - date_cap_h / 2
+def _calcola_metriche():
+    global name_face, desc_face, name_ascent, name_descent, desc_ascent, desc_descent
+    global name_cap_h, desc_cap_h, name_lh, desc_lh, NAME_DESC_BL, DISH_STD_GAP
+    global date_face, date_cap_h, DATE_BASELINE
+
+    name_face = pdfmetrics.getFont("BernhardMod").face
+    desc_face = pdfmetrics.getFont("BernhardMod-It").face
+
+    name_ascent  = name_face.ascent  / name_face.unitsPerEm * SZ_DISH_NAME
+    name_descent = abs(name_face.descent) / name_face.unitsPerEm * SZ_DISH_NAME
+    desc_ascent  = desc_face.ascent  / desc_face.unitsPerEm * SZ_DESC
+    desc_descent = abs(desc_face.descent) / desc_face.unitsPerEm * SZ_DESC
+
+    # Cap height (altezza maiuscole) per centraggio separatore
+    try:
+        name_cap_h = name_face.capHeight / name_face.unitsPerEm * SZ_DISH_NAME
+    except AttributeError:
+        name_cap_h = name_ascent
+    try:
+        desc_cap_h = desc_face.capHeight / desc_face.unitsPerEm * SZ_DESC
+    except AttributeError:
+        desc_cap_h = desc_ascent
+
+    # Interlinea (tra righe dello stesso elemento, es. nome che va a capo)
+    name_lh = SZ_DISH_NAME * 1.3   # 26 pt
+    desc_lh = SZ_DESC * 1.3         # 18.2 pt
+
+    NAME_DESC_BL = VISUAL_GAP_NAME_DESC + name_descent + desc_ascent
+
+    # Gap standard tra blocchi: riferimento da 7 piatti tipici (~54pt).
+    # Usato come tetto massimo per evitare gap enormi con pochi piatti.
+    _ref_avail = P2_DISHES_START_Y - P2_DISHES_END_Y
+    DISH_STD_GAP = (_ref_avail - 7 * NAME_DESC_BL) / 6
+
+    # Baseline data copertina (costante, indipendente dal contenuto)
+    date_face = pdfmetrics.getFont(DATE_FONT).face
+    date_cap_h = (date_face.ascent / date_face.unitsPerEm) * DATE_SIZE
+    _gap_mid = (P1_OVAL_BOTTOM_Y + P1_ITALIC_TOP_Y) / 2
+    DATE_BASELINE = _gap_mid - date_cap_h / 2
+
+    # Stampa di verifica
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Margine decorazioni: %s pt (%.1f mm)", SAFETY, SAFETY / 2.835)
+        log.debug("Font nomi: BernhardMod Regular %spt (ascent=%.1f, descent=%.1f, cap_h=%.1f)",
+                  SZ_DISH_NAME, name_ascent, name_descent, name_cap_h)
+        log.debug("Font desc: BernhardMod-It %spt (ascent=%.1f, descent=%.1f)",
+                  SZ_DESC, desc_ascent, desc_descent)
+        log.debug("Nome->desc baseline: %.1fpt (= %spt gap + %.1fpt descent + %.1fpt ascent)",
+                  NAME_DESC_BL, VISUAL_GAP_NAME_DESC, name_descent, desc_ascent)
+
+@lru_cache(maxsize=64)
+def metriche_piatti(scala=1.0):
+    """Corpi e metriche dei blocchi piatto a `scala` (1.0 = SZ_DISH_NAME,
+    SZ_DESC e le metriche globali di _calcola_metriche). L'auto-fit passa
+    alle funzioni dei blocchi la scala ridotta; i globali restano intatti.
+    Il gap tra piatti non è qui: _posiziona_piatti lo ricava dallo spazio
+    libero, quindi cresce da solo quando i blocchi si accorciano."""
+    sz_nome, sz_desc = SZ_DISH_NAME * scala, SZ_DESC * scala
+    n_ascent = name_face.ascent / name_face.unitsPerEm * sz_nome
+    n_descent = abs(name_face.descent) / name_face.unitsPerEm * sz_nome
+    d_ascent = desc_face.ascent / desc_face.unitsPerEm * sz_desc
+    d_descent = abs(desc_face.descent) / desc_face.unitsPerEm * sz_desc
+    try:
+        n_cap_h = name_face.capHeight / name_face.unitsPerEm * sz_nome
+    except AttributeError:
+        n_cap_h = n_ascent
+    name_desc_bl = VISUAL_GAP_NAME_DESC * scala + n_descent + d_ascent
+    return {
+        "sz_nome": sz_nome, "sz_desc": sz_desc,
+        "name_lh": sz_nome * 1.3, "desc_lh": sz_desc * 1.3,
+        "name_desc_bl": name_desc_bl,
+        "name_descent": n_descent, "desc_descent": d_descent, "name_cap_h": n_cap_h,
+    }
 
 # ══════════════════════════════════════════════════════════════
-# STAMPA DI VERIFICA
+# INIZIALIZZAZIONE — lazy: l'import del modulo non carica nulla
 # ══════════════════════════════════════════════════════════════
-print(f"\nMargine decorazioni: {SAFETY} pt ({SAFETY/2.835:.1f} mm)")
-print(f"Font nomi: BernhardMod Regular {SZ_DISH_NAME}pt "
-      f"(ascent={name_ascent:.1f}, descent={name_descent:.1f}, cap_h={name_cap_h:.1f})")
-print(f"Font desc: BernhardMod-It {SZ_DESC}pt "
-      f"(ascent={desc_ascent:.1f}, descent={desc_descent:.1f})")
-print(f"Nome->desc baseline: {NAME_DESC_BL:.1f}pt "
-      f"(= {VISUAL_GAP_NAME_DESC}pt gap + {name_descent:.1f}pt descent + {desc_ascent:.1f}pt ascent)")
-print(f"Separatore: {SEP_SRC.name} ricolorato RGB{SEP_CLR} al {SEP_OPACITY*100:.0f}%, "
-      f"larghezza={SEP_DRAW_W}pt")
+_PRONTO = False
+_METRICHE = {
+    "name_face", "desc_face", "name_ascent", "name_descent", "desc_ascent",
+    "desc_descent", "name_cap_h", "desc_cap_h", "name_lh", "desc_lh",
+    "NAME_DESC_BL", "DISH_STD_GAP", "date_face", "date_cap_h", "DATE_BASELINE",
+}
+
+def prepara(separatore_incluso=False):
+    """Registra i font, calcola le metriche e carica i profili delle
+    decorazioni (una sola volta per processo).
+
+    Chiamata da genera_souvenir/genera_serata; richiamabile in anticipo per
+    pre-riscaldare (worker del pool, avvio app). Con `separatore_incluso`
+    renderizza subito anche il separatore, altrimenti al primo piatto."""
+    global _PRONTO
+    if not _PRONTO:
+        _registra_font()
+        _calcola_metriche()
+        _margini_dilatati()  # profili decorazioni: tabelle o sidecar dello sfondo
+        mappa_zone(0)        # zone 2D copertina: sidecar dello sfondo
+        _PRONTO = True
+    if separatore_incluso:
+        aspetto_separatore()
+
+def __getattr__(nome):
+    """Accesso dall'esterno alle metriche (PEP 562): inizializza al volo."""
+    if nome in _METRICHE:
+        prepara()
+        return globals()[nome]
+    if nome in ("SEP_READER", "SEP_ASPECT"):
+        return aspetto_separatore() if nome == "SEP_ASPECT" else separatore()[0]
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
 
 # ══════════════════════════════════════════════════════════════
 # DATABASE (lazy: può essere iniettato dall'esterno via set_db)
 # ══════════════════════════════════════════════════════════════
 DB = None
+_DB_VERSIONE = None  # impronta del DB corrente, calcolata al primo uso
 
 def _load_db_from_file():
     """Carica DB dal file JSON locale (fallback)."""
@@ -349,8 +718,9 @@ def _load_db_from_file():
 
 def set_db(db_dict):
     """Inietta il database dall'esterno (es. da Supabase)."""
-    global DB
+    global DB, _DB_VERSIONE
     DB = db_dict
+    _DB_VERSIONE = None
 
 def get_db():
     """Ritorna il DB corrente; se non ancora caricato, carica da file."""
@@ -359,6 +729,13 @@ def get_db():
         DB = _load_db_from_file()
     return DB
 
+def versione_db():
+    """Impronta del DB corrente: cambia a ogni set_db con contenuto diverso."""
+    global _DB_VERSIONE
+    if _DB_VERSIONE is None:
+        _DB_VERSIONE = impronta_dati(get_db())
+    return _DB_VERSIONE
+
 def find_dish(dish_id):
     """Cerca un piatto per ID (esatto -> prefisso -> contenuto).
 
@@ -430,34 +807,88 @@ def safe_filename(s):
 def balanced_split(text, font, size, max_width):
     """Spezza il testo in 2 righe bilanciate alla parola più vicina alla metà.
     Se entra in una riga, ritorna lista con una sola riga.
-    Se una metà eccede max_width, fallback a simpleSplit."""
-    tw = pdfmetrics.stringWidth(text, font, size)
+    Se una metà eccede max_width, fallback a split_ottimale (k righe).
+    Le larghezze dei prefissi vengono dalle somme cumulative: O(1) per taglio."""
+    tw = larghezza(text, font, size)
     if tw <= max_width:
         return [text]
-    words = text.split()
+    misura = misura_parole(text, font, size)
+    words = misura.parole
     if len(words) <= 1:
         return [text]
     target = tw / 2
     best_i, best_diff = 1, float('inf')
     for i in range(1, len(words)):
-        w = pdfmetrics.stringWidth(' '.join(words[:i]), font, size)
-        diff = abs(w - target)
+        diff = abs(misura(0, i) - target)
         if diff < best_diff:
             best_diff = diff
             best_i = i
-    line1 = ' '.join(words[:best_i])
-    line2 = ' '.join(words[best_i:])
-    w1 = pdfmetrics.stringWidth(line1, font, size)
-    w2 = pdfmetrics.stringWidth(line2, font, size)
-    if w1 <= max_width and w2 <= max_width:
-        return [line1, line2]
-    return simpleSplit(text, font, size, max_width)
+    if (misura(0, best_i) <= max_width
+            and misura(best_i, len(words)) <= max_width):
+        return [' '.join(words[:best_i]), ' '.join(words[best_i:])]
+    return split_ottimale(text, font, size, max_width)
+
+def split_ottimale(text, font, size, max_width):
+    """Spezza il testo nel minimo numero di righe entro max_width (come il
+    greedy di simpleSplit) ma bilanciate: tra le divisioni con quel numero
+    di righe sceglie quella con la minima somma dei quadrati dello spazio
+    libero (programmazione dinamica sulle larghezze cumulate).
+    Una parola più larga di max_width resta da sola sulla sua riga."""
+    misura = misura_parole(text, font, size)
+    words = misura.parole
+    n = len(words)
+    if n == 0:
+        return []
+
+    # Numero minimo di righe: riempimento greedy da sinistra. avanti[j] è
+    # il massimo di parole che stanno in j righe; indietro[j] il minimo
+    # indice da cui le parole restanti stanno in j righe (greedy da destra).
+    avanti = [0]
+    while avanti[-1] < n:
+        l = avanti[-1]
+        i = l + 1
+        while i < n and misura(l, i + 1) <= max_width:
+            i += 1
+        avanti.append(i)
+    k = len(avanti) - 1
+    indietro = [n]
+    while len(indietro) <= k:
+        r = indietro[-1]
+        i = r - 1
+        while i > 0 and misura(i - 1, r) <= max_width:
+            i -= 1
+        indietro.append(max(i, 0))
+
+    # costo[j][i]: migliore divisione di words[:i] in j righe; la j-esima
+    # riga può finire solo tra indietro[k-j] e avanti[j]
+    inf = float('inf')
+    costo = [[inf] * (n + 1) for _ in range(k + 1)]
+    taglio = [[0] * (n + 1) for _ in range(k + 1)]
+    costo[0][0] = 0.0
+    for j in range(1, k + 1):
+        for i in range(max(j, indietro[k - j]), avanti[j] + 1):
+            for l in range(i - 1, j - 2, -1):
+                w = misura(l, i)
+                if w > max_width and i - l > 1:
+                    break  # righe più lunghe verso sinistra: non entrano
+                c = costo[j - 1][l] + max(0.0, max_width - w) ** 2
+                if c < costo[j][i]:
+                    costo[j][i] = c
+                    taglio[j][i] = l
+
+    righe = []
+    i = n
+    for j in range(k, 0, -1):
+        l = taglio[j][i]
+        righe.append(' '.join(words[l:i]))
+        i = l
+    return righe[::-1]
 
 def draw_line_safe(c, text, center_x, y, font, size, color, half_side="left"):
     """Disegna una riga centrata, spostata orizzontalmente se in zona proibita."""
     c.setFont(font, size)
     c.setFillColorRGB(*color)
-    tw = pdfmetrics.stringWidth(text, font, size)
+    tw = larghezza(text, font, size)
     x = center_x - tw / 2
     if half_side == "left":
         safe_left = get_left_safe_margin(y)
@@ -480,20 +911,23 @@ def draw_line_safe(c, text, center_x, y, font, size, color, half_side="left"):
 # Piatti e vini usano le stesse funzioni con parametri diversi.
 # ══════════════════════════════════════════════════════════════
 
-def compute_block_h(n_name, n_desc):
-    """Altezza di un blocco testo dal numero di righe nome/desc."""
+def compute_block_h(n_name, n_desc, m=None):
+    """Altezza di un blocco testo dal numero di righe nome/desc.
+    `m`: metriche_piatti() (default corpo pieno), come per tutti i blocchi."""
+    m = m or metriche_piatti()
     if n_desc > 0:
-        return (n_name - 1) * name_lh + NAME_DESC_BL + (n_desc - 1) * desc_lh
-    return (n_name - 1) * name_lh
+        return (n_name - 1) * m["name_lh"] + m["name_desc_bl"] + (n_desc - 1) * m["desc_lh"]
+    return (n_name - 1) * m["name_lh"]
 
-def make_text_block(nome, desc, max_width):
+def make_text_block(nome, desc, max_width, m=None):
     """Crea un blocco {nome, desc, name_lines, desc_lines, block_h, has_desc}."""
-    nl = simpleSplit(nome, "BernhardMod", SZ_DISH_NAME, max_width)
-    dl = balanced_split(desc, "BernhardMod-It", SZ_DESC, max_width) if desc else []
+    m = m or metriche_piatti()
+    nl = simpleSplit(nome, "BernhardMod", m["sz_nome"], max_width)
+    dl = balanced_split(desc, "BernhardMod-It", m["sz_desc"], max_width) if desc else []
     return {
         "nome": nome, "desc": desc,
         "name_lines": nl, "desc_lines": dl,
-        "block_h": compute_block_h(len(nl), len(dl)),
+        "block_h": compute_block_h(len(nl), len(dl), m),
         "has_desc": len(dl) > 0,
     }
 
@@ -561,93 +995,188 @@ def get_block_y_positions(block):
                 yc -= desc_lh
     return ys
 
-def find_block_tightest_margin(block, safe_margin_fn, side):
+def find_block_tightest_margin(block, safe_margin_fn, side, m=None):
     """Trova il margine sicuro più stretto per un blocco.
 
     Usa get_safe_margin_for_extent per controllare l'intera estensione
     verticale di ogni riga (baseline ± ascent/descent).
     side='left': ritorna max (margine sinistro più spinto a destra).
     side='right': ritorna min (margine destro più spinto a sinistra)."""
+    m = m or metriche_piatti()
     margins = []
     yc = block["y_start"]
     for j in range(len(block["name_lines"])):
         margins.append(get_safe_margin_for_extent(
-            yc, "BernhardMod", SZ_DISH_NAME, side))
+            yc, "BernhardMod", m["sz_nome"], side))
         if j < len(block["name_lines"]) - 1:
-            yc -= name_lh
+            yc -= m["name_lh"]
     if block["has_desc"]:
-        yc -= NAME_DESC_BL
+        yc -= m["name_desc_bl"]
         for j in range(len(block["desc_lines"])):
             margins.append(get_safe_margin_for_extent(
-                yc, "BernhardMod-It", SZ_DESC, side))
+                yc, "BernhardMod-It", m["sz_desc"], side))
             if j < len(block["desc_lines"]) - 1:
-                yc -= desc_lh
+                yc -= m["desc_lh"]
     if side == "left":
         return max(margins) if margins else 0
     return min(margins) if margins else pw
 
-def rewrap_block(block, safe_w, split_fn):
+def righe_blocco(block, m=None):
+    """(y, testo, font, corpo) di ogni riga di un blocco posizionato."""
+    m = m or metriche_piatti()
+    y = block["y_start"]
+    for j, line in enumerate(block["name_lines"]):
+        yield y, line, "BernhardMod", m["sz_nome"]
+        if j < len(block["name_lines"]) - 1:
+            y -= m["name_lh"]
+    if block["has_desc"]:
+        y -= m["name_desc_bl"]
+        for j, line in enumerate(block["desc_lines"]):
+            yield y, line, "BernhardMod-It", m["sz_desc"]
+            if j < len(block["desc_lines"]) - 1:
+                y -= m["desc_lh"]
+
+def block_max_width(block, name_lines=None, desc_lines=None, m=None):
+    """Larghezza della riga più larga di un blocco (nome o descrizione)."""
+    m = m or metriche_piatti()
+    nl = block["name_lines"] if name_lines is None else name_lines
+    dl = block["desc_lines"] if desc_lines is None else desc_lines
+    return max([larghezza(l, "BernhardMod", m["sz_nome"]) for l in nl]
+               + [larghezza(l, "BernhardMod-It", m["sz_desc"]) for l in dl], default=0)
+
+def rewrap_block(block, safe_w, split_fn, m=None):
     """Re-splitta nome/desc per entrare in safe_w.
-    Ritorna True se il numero di righe è cambiato."""
-    new_nl = split_fn(block["nome"], "BernhardMod", SZ_DISH_NAME, safe_w)
-    new_dl = balanced_split(block["desc"], "BernhardMod-It", SZ_DESC, safe_w) \
+    Applica le nuove righe solo se la riga più larga si restringe (così
+    ogni re-wrap è un progresso) e ritorna True se le ha applicate."""
+    m = m or metriche_piatti()
+    new_nl = split_fn(block["nome"], "BernhardMod", m["sz_nome"], safe_w)
+    new_dl = balanced_split(block["desc"], "BernhardMod-It", m["sz_desc"], safe_w) \
              if block["desc"] else []
-    if len(new_nl) != len(block["name_lines"]) or \
-       len(new_dl) != len(block["desc_lines"]):
+    if block_max_width(block, new_nl, new_dl, m) < block_max_width(block, m=m):
         block["name_lines"] = new_nl
         block["desc_lines"] = new_dl
         block["has_desc"] = len(new_dl) > 0
-        block["block_h"] = compute_block_h(len(new_nl), len(new_dl))
+        block["block_h"] = compute_block_h(len(new_nl), len(new_dl), m)
         return True
     return False
 
-def collect_block_elements(blocks, center_x, side, label_prefix):
+def _posiziona_piatti(blocks):
+    """Gap naturale tra i piatti (tetto 70pt) e gruppo centrato leggermente
+    sopra il centro visivo (40/60). Posiziona i blocchi, ritorna il gap."""
+    N = len(blocks)
+    total_available = P2_DISHES_START_Y - P2_DISHES_END_Y
+    total_content = sum(b["block_h"] for b in blocks)
+    gap_count = N - 1 if N > 1 else 1
+
+    # Gap naturale: distribuisci lo spazio disponibile tra i piatti
+    # Cap massimo a 70pt (~25mm) per non esagerare con pochi piatti
+    natural_gap = (total_available - total_content) / gap_count if gap_count > 0 else 0
+    gap_height = min(70, natural_gap)
+
+    # Centra il gruppo leggermente sopra il centro visivo (40/60)
+    group_h = total_content + (gap_count * gap_height if N > 1 else 0)
+    remaining = total_available - group_h
+    y_top = P2_DISHES_START_Y - remaining * 0.40
+    y_top = min(y_top, P2_DISHES_START_Y)
+    _position_blocks_from_y(blocks, gap_height, y_top, P2_DISHES_END_Y)
+    return gap_height
+
+def risolvi_piatti(blocks, m=None):
+    """Righe, gap e larghezze sicure dei piatti risolti insieme.
+
+    Un blocco va ri-splittato SOLO se il testo non entra nello spazio fisico
+    tra decorazione e piega (fit_w) alla posizione corrente; dopo ogni giro
+    di re-wrap il gruppo viene riposizionato. La riga più larga di ogni
+    blocco può solo restringersi e le larghezze possibili sono finite:
+    il ciclo converge sempre, senza tetto di iterazioni.
+    Un blocco che non può entrare (parola più larga dello spazio) resta in
+    gioco a ogni giro — dopo un riposizionamento potrebbe entrare, o avere
+    meno spazio. A fine ciclo la diagnostica elenca le righe che non
+    entrano nel margine della LORO estensione, lo stesso criterio del
+    controllo finale: sono le righe che faranno abortire il layout.
+    Ritorna (gap, iterazioni, diagnostica)."""
+    m = m or metriche_piatti()
+
+    def spazio(b):
+        margin = find_block_tightest_margin(b, get_left_safe_margin, "left", m)
+        return P2_LEFT_MAX_X - margin
+
+    gap_height = _posiziona_piatti(blocks)
+    iterazioni = 0
+    while True:
+        iterazioni += 1
+        rewrapped = False
+        for b in blocks:
+            fit_w = spazio(b)
+            if block_max_width(b, m=m) <= fit_w:
+                continue
+            if fit_w > 0 and rewrap_block(b, fit_w, simpleSplit, m):
+                rewrapped = True
+        if not rewrapped:
+            break
+        # Riposiziona dopo re-wrap
+        gap_height = _posiziona_piatti(blocks)
+
+    # Diagnostica alle posizioni finali, riga per riga
+    senza_spazio = []
+    for i, b in enumerate(blocks):
+        for y, testo, font, size in righe_blocco(b, m):
+            tw = larghezza(testo, font, size)
+            fit_w = P2_LEFT_MAX_X - get_safe_margin_for_extent(y, font, size, "left")
+            if tw > fit_w:
+                senza_spazio.append({"blocco": i, "nome": b["nome"], "riga": testo,
+                                     "y": y, "larghezza": tw, "spazio": fit_w})
+    return gap_height, iterazioni, senza_spazio
+
+def collect_block_elements(blocks, center_x, side, label_prefix, m=None):
     """Crea elementi testo da blocchi posizionati.
     Ritorna lista di dict per elements[]. Ogni elemento ha block_idx
     per il riallineamento post-correzione."""
+    m = m or metriche_piatti()
     elems = []
     for i, b in enumerate(blocks):
         y = b["y_start"]
         for j, line in enumerate(b["name_lines"]):
-            tw = pdfmetrics.stringWidth(line, "BernhardMod", SZ_DISH_NAME)
+            tw = larghezza(line, "BernhardMod", m["sz_nome"])
             elems.append({
                 "text": line, "x": center_x - tw / 2, "y": y,
-                "font": "BernhardMod", "size": SZ_DISH_NAME,
+                "font": "BernhardMod", "size": m["sz_nome"],
                 "color": CLR_DISH_NAME, "alpha": 1.0, "tw": tw,
                 "side": side, "label": f"{label_prefix} {i+1} nome",
                 "block_idx": i, "block_prefix": label_prefix,
             })
             if j < len(b["name_lines"]) - 1:
-                y -= name_lh
+                y -= m["name_lh"]
         if b["has_desc"]:
-            y -= NAME_DESC_BL
+            y -= m["name_desc_bl"]
             for j, line in enumerate(b["desc_lines"]):
-                tw = pdfmetrics.stringWidth(line, "BernhardMod-It", SZ_DESC)
+                tw = larghezza(line, "BernhardMod-It", m["sz_desc"])
                 elems.append({
                     "text": line, "x": center_x - tw / 2, "y": y,
-                    "font": "BernhardMod-It", "size": SZ_DESC,
+                    "font": "BernhardMod-It", "size": m["sz_desc"],
                     "color": CLR_DESC, "alpha": 1.0, "tw": tw,
                     "side": side, "label": f"{label_prefix} {i+1} desc",
                     "block_idx": i, "block_prefix": label_prefix,
                 })
                 if j < len(b["desc_lines"]) - 1:
-                    y -= desc_lh
+                    y -= m["desc_lh"]
     return elems
 
-def place_block_separators(blocks, center_x, side="left"):
+def place_block_separators(blocks, center_x, side="left", m=None):
     """Crea separatori (righe rosse) tra blocchi consecutivi.
     Formula: punto medio visivo tra descent e cap_height."""
+    m = m or metriche_piatti()
     seps = []
     for i in range(len(blocks) - 1):
         b = blocks[i]
         next_b = blocks[i + 1]
         if b["has_desc"]:
-            y_vis_bottom = b["y_end"] - desc_descent
+            y_vis_bottom = b["y_end"] - m["desc_descent"]
         else:
-            y_vis_bottom = b["y_end"] - name_descent
-        y_vis_top = next_b["y_start"] + name_cap_h
+            y_vis_bottom = b["y_end"] - m["name_descent"]
+        y_vis_top = next_b["y_start"] + m["name_cap_h"]
         sep_center_y = (y_vis_bottom + y_vis_top) / 2
-        sep_draw_h = SEP_DRAW_W / SEP_ASPECT
+        sep_draw_h = SEP_DRAW_W / aspetto_separatore()
         sep_x = center_x - SEP_DRAW_W / 2
         sep_y = sep_center_y - sep_draw_h / 2
         seps.append({"x": sep_x, "y": sep_y, "w": SEP_DRAW_W, "h": sep_draw_h,
@@ -655,77 +1184,49 @@ def place_block_separators(blocks, center_x, side="left"):
     return seps
 
 # ══════════════════════════════════════════════════════════════
-# FUNZIONE PRINCIPALE: genera un PDF souvenir per un ospite
+# OVERLAY PER OSPITE: pagina 1 (copertina) e pagina 2 (interno)
 # ══════════════════════════════════════════════════════════════
 
-def genera_souvenir(data_val, tavolo, ospite, lingua, tipo_menu,
-                    piatti_csv, tipo_vini="", vini_raw="", output_path=None,
-                    numero_ospite=None, mostra_prezzo=False):
-    """Genera un PDF souvenir per un singolo ospite."""
+def _layout_pagina1(lingua, date_text, team_members):
+    """Layout pagina 1: data, testo introduttivo e team, come sequenza da
+    disegnare in ordine di rettangoli bianchi di copertura ("copertura")
+    e righe di testo ("testo", con x già calcolata)."""
+    voci = []
 
-    dt = parse_date(data_val)
-    lingua = str(lingua).strip().lower()
-    date_text = format_date(dt, lingua)
-    tipo_menu = str(tipo_menu).strip().lower()
-    # Composizione menu degustazione: leggi piatti_ids e nome dal DB
-    db = get_db()
-    menu_piatti_db = {}
-    menu_nomi_db = {}
-    for m in db.get("menu_degustazione", []):
-        if m.get("piatti_ids"):
-            menu_piatti_db[m["id"]] = m["piatti_ids"]
-        if m.get("nome"):
-            menu_nomi_db[m["id"]] = m["nome"]
+    def testo(text, x, y, font, size, color, label):
+        voci.append({"tipo": "testo", "text": text, "x": x, "y": y, "font": font,
+                     "size": size, "color": color, "label": label,
+                     "tw": larghezza(text, font, size)})
 
-    if tipo_menu in menu_piatti_db:
-        piatti_ids = menu_piatti_db[tipo_menu]
-    elif tipo_menu != "carta":
-        print(f"  [!] Menu '{tipo_menu}' non ha piatti_ids nel database — PDF senza piatti")
-        piatti_ids = []
-    else:
-        # Carta: leggi dal campo piatti dell'Excel/UI
-        piatti_ids = [p.strip() for p in str(piatti_csv).split(",") if p.strip()]
-
-    print(f"\n{'='*60}")
-    print(f"Ospite: {ospite} | Tavolo: {tavolo} | Lingua: {lingua}")
-    print(f"Menu: {tipo_menu}")
-
-    # ── OVERLAY PAGINA 1 — data + numero tavolo/ospite ──
-    buf1 = io.BytesIO()
-    c1 = Canvas(buf1, pagesize=(pw, ph))
-    c1.setFillColorRGB(*CLR_DATE)
-    c1.setFont(DATE_FONT, DATE_SIZE)
-    c1.drawCentredString(P1_DATE_X, DATE_BASELINE, date_text)
+    tw = larghezza(date_text, DATE_FONT, DATE_SIZE)
+    testo(date_text, P1_DATE_X - tw / 2, DATE_BASELINE, DATE_FONT, DATE_SIZE,
+          CLR_DATE, "data")
 
     # ── Testo introduttivo tradotto (copertina, metà destra) ──
     # Copre il testo italiano originale dello sfondo e lo ridisegna nella lingua corretta.
     intro_cx = P1_DATE_X  # ~631pt — centro della metà destra
     intro_text = INTRO_TEXTS.get(lingua, INTRO_TEXTS["it"])
     # Rettangolo bianco per coprire il testo originale
-    c1.setFillColorRGB(1, 1, 1)
-    c1.rect(intro_cx - INTRO_MAX_W / 2 - 5, INTRO_COVER_Y1,
-            INTRO_MAX_W + 10, INTRO_COVER_Y2 - INTRO_COVER_Y1,
-            stroke=0, fill=1)
+    voci.append({"tipo": "copertura",
+                 "rect": (intro_cx - INTRO_MAX_W / 2 - 5, INTRO_COVER_Y1,
+                          INTRO_MAX_W + 10, INTRO_COVER_Y2 - INTRO_COVER_Y1)})
     # Word-wrap e disegno centrato
-    c1.setFillColorRGB(*CLR_TEAM)
     intro_lines = simpleSplit(intro_text, "BernhardMod-It", INTRO_SZ, INTRO_MAX_W)
     y = INTRO_FIRST_Y
-    for line in intro_lines:
-        c1.setFont("BernhardMod-It", INTRO_SZ)
-        c1.drawCentredString(intro_cx, y, line)
+    for i, line in enumerate(intro_lines):
+        tw = larghezza(line, "BernhardMod-It", INTRO_SZ)
+        testo(line, intro_cx - tw / 2, y, "BernhardMod-It", INTRO_SZ, CLR_TEAM,
+              f"intro {i}")
         y -= INTRO_LINE_H
 
     # ── Team block dinamico (copertina, metà destra) ──
     # Copre il blocco nomi originale nello sfondo e li rigenera dal DB.
     team_cx = P1_DATE_X  # ~631pt — centro della metà destra
-    team_members = db.get("team", [])
     if team_members:
         # Rettangolo bianco per coprire il testo originale
-        c1.setFillColorRGB(1, 1, 1)
-        c1.rect(team_cx - 130, TEAM_COVER_Y1, 260, TEAM_COVER_Y2 - TEAM_COVER_Y1,
-                stroke=0, fill=1)
-
-        c1.setFillColorRGB(*CLR_TEAM)
+        voci.append({"tipo": "copertura",
+                     "rect": (team_cx - 130, TEAM_COVER_Y1, 260,
+                              TEAM_COVER_Y2 - TEAM_COVER_Y1)})
 
         # Header: "Un'esperienza a cura di:" in Bellevue 13pt
         # Bellevue non ha apostrofo → segmenti con fallback BernhardMod
@@ -737,33 +1238,30 @@ def genera_souvenir(data_val, tavolo, ospite, lingua, tipo_menu,
                 segs.append(("\u2019", "BernhardMod-It", TEAM_HEADER_SZ))
             if part:
                 segs.append((part, "Bellevue", TEAM_HEADER_SZ))
-        h_total_w = sum(pdfmetrics.stringWidth(s, f, sz) for s, f, sz in segs)
+        h_total_w = sum(larghezza(s, f, sz) for s, f, sz in segs)
         hx = team_cx - h_total_w / 2
         for seg_text, seg_font, seg_sz in segs:
-            c1.setFont(seg_font, seg_sz)
-            c1.drawString(hx, TEAM_HEADER_Y, seg_text)
-            hx += pdfmetrics.stringWidth(seg_text, seg_font, seg_sz)
+            testo(seg_text, hx, TEAM_HEADER_Y, seg_font, seg_sz, CLR_TEAM, "team header")
+            hx += larghezza(seg_text, seg_font, seg_sz)
 
         # Membri team — nome in regular, ruolo in italico (dal DB, senza trasformazioni)
         y = TEAM_FIRST_Y
-        for member in team_members:
+        for i, member in enumerate(team_members):
             nome = member.get("nome", "")
             label = member.get("ruolo", "")
 
             # Calcola larghezza totale per centrare
             nome_part = f"{nome}, " if label else nome
-            w_nome = pdfmetrics.stringWidth(nome_part, "BernhardMod", TEAM_BODY_SZ)
-            w_label = pdfmetrics.stringWidth(label, "BernhardMod-It", TEAM_BODY_SZ) if label else 0
+            w_nome = larghezza(nome_part, "BernhardMod", TEAM_BODY_SZ)
+            w_label = larghezza(label, "BernhardMod-It", TEAM_BODY_SZ) if label else 0
             total_w = w_nome + w_label
             x = team_cx - total_w / 2
 
-            # Disegna nome (regular)
-            c1.setFont("BernhardMod", TEAM_BODY_SZ)
-            c1.drawString(x, y, nome_part)
-            # Disegna ruolo (italico)
+            # Nome (regular) + ruolo (italico)
+            testo(nome_part, x, y, "BernhardMod", TEAM_BODY_SZ, CLR_TEAM, f"team {i} nome")
             if label:
-                c1.setFont("BernhardMod-It", TEAM_BODY_SZ)
-                c1.drawString(x + w_nome, y, label)
+                testo(label, x + w_nome, y, "BernhardMod-It", TEAM_BODY_SZ, CLR_TEAM,
+                      f"team {i} ruolo")
             y -= TEAM_LINE_H
 
         # Footer: "e tutti i loro collaboratori"
@@ -774,54 +1272,176 @@ def genera_souvenir(data_val, tavolo, ospite, lingua, tipo_menu,
         }
         footer = footer_labels.get(lingua, footer_labels["it"])
         y -= TEAM_LINE_H * 0.3  # piccolo extra gap prima del footer
-        c1.setFont("BernhardMod-It", TEAM_BODY_SZ)
-        ftw = pdfmetrics.stringWidth(footer, "BernhardMod-It", TEAM_BODY_SZ)
-        c1.drawString(team_cx - ftw / 2, y, footer)
+        ftw = larghezza(footer, "BernhardMod-It", TEAM_BODY_SZ)
+        testo(footer, team_cx - ftw / 2, y, "BernhardMod-It", TEAM_BODY_SZ, CLR_TEAM,
+              "team footer")
+
+    return voci
+
+def _controlla_pagina1(voci):
+    """Verifica ogni riga di testo della copertina sulla mappa 2D delle zone
+    (esclusi i rettangoli bianchi di copertura). Una collisione non blocca
+    il PDF — le posizioni della copertina sono fisse — ma viene segnalata.
+    Ritorna l'esito per riga."""
+    coperture = tuple((x, y, x + w, y + h) for x, y, w, h in
+                      (v["rect"] for v in voci if v["tipo"] == "copertura"))
+    esiti = []
+    for v in voci:
+        if v["tipo"] != "testo":
+            continue
+        ascent, descent = estensione_font(v["font"], v["size"])
+        libero = zona_libera(0, v["x"], v["y"] - descent, v["x"] + v["tw"],
+                             v["y"] + ascent, coperture=coperture)
+        esiti.append({"label": v["label"], "esito": "ok" if libero else "collisione",
+                      "y": v["y"], "x": v["x"], "x_fine": v["x"] + v["tw"]})
+        if not libero:
+            log.warning("  [!] Copertina: '%s' su una decorazione dello sfondo "
+                        "(y=%.0f [%.0f..%.0f])", v["label"], v["y"], v["x"], v["x"] + v["tw"])
+    log.debug("  Copertina: %d/%d righe libere da decorazioni",
+              sum(e["esito"] == "ok" for e in esiti), len(esiti))
+    return esiti
+
+@lru_cache(maxsize=32)
+def _copertina(lingua, date_text, team):
+    members = [{"nome": nome, "ruolo": ruolo} for nome, ruolo in team]
+    voci = _layout_pagina1(lingua, date_text, members)
+    return {"voci": voci, "esiti": _controlla_pagina1(voci),
+            "form": "Copertina" + impronta_dati([lingua, date_text, team])[:16]}
+
+def copertina(lingua, date_text, team_members):
+    """Parte comune della copertina (tutto tranne il numero tavolo/ospite)
+    per lingua, data e team: layout e controllo calcolati una volta, poi
+    disegnati come un unico Form XObject per documento.
+    Ritorna {voci, esiti, form}."""
+    team = tuple((m.get("nome", ""), m.get("ruolo", "")) for m in team_members)
+    return _copertina(lingua, date_text, team)
+
+def _disegna_pagina1(c, copertina, tavolo, numero_ospite):
+    """Overlay pagina 1: form della copertina (coperture e testi, creato al
+    primo uso nel documento di `c`), poi il numero tavolo/ospite."""
+    nome = copertina["form"]
+    if not c._doc.hasForm(nome):
+        c.beginForm(nome)
+        for v in copertina["voci"]:
+            if v["tipo"] == "copertura":
+                c.setFillColorRGB(1, 1, 1)
+                c.rect(*v["rect"], stroke=0, fill=1)
+            else:
+                c.setFillColorRGB(*v["color"])
+                c.setFont(v["font"], v["size"])
+                c.drawString(v["x"], v["y"], v["text"])
+        c.endForm()
+    c.doForm(nome)
 
     # Numero tavolo e ospite — retro (metà sinistra), basso a sinistra, verticale
     if numero_ospite is not None:
-        c1.saveState()
-        c1.translate(12, 35)
-        c1.rotate(270)
-        c1.setFont("BernhardMod-It", 8)
-        c1.setFillColorRGB(*CLR_DESC)
-        c1.drawString(0, 0, f"{tavolo} - {numero_ospite}")
-        c1.restoreState()
+        c.saveState()
+        c.translate(12, 35)
+        c.rotate(270)
+        c.setFont("BernhardMod-It", 8)
+        c.setFillColorRGB(*CLR_DESC)
+        c.drawString(0, 0, f"{tavolo} - {numero_ospite}")
+        c.restoreState()
+
+def _verifica_elementi(elements, traccia=False):
+    """Controllo finale e centratura di una lista di elementi di pagina 2
+    (x corrette sul posto). Ritorna (esiti per elemento, numero di elementi
+    impossibili da posizionare, righe ricentrate); con errori le righe non
+    vengono ricentrate."""
+    # ══════════════════════════════════════════════════════════════
+    # CONTROLLO FINALE ASSOLUTO
+    # Verifica OGNI elemento con l'intera estensione verticale del testo
+    # (baseline ± ascent/descent). Se dopo la correzione il testo è ancora
+    # dentro una zona proibita → ABORT: il PDF NON viene generato.
+    # Titoli decorativi: posizione centrata, nessun vincolo.
+    # ══════════════════════════════════════════════════════════════
+    # Vista colonnare: margini, correzioni ed errori per tutti gli
+    # elementi in un solo passaggio NumPy, poi scrittura negli elementi.
+    import numpy as np
+    n_el = len(elements)
+    x = np.fromiter((el["x"] for el in elements), np.float64, n_el)
+    tw = np.fromiter((el["tw"] for el in elements), np.float64, n_el)
+    y_el = np.fromiter((el["y"] for el in elements), np.float64, n_el)
+    estensioni = [estensione_font(el["font"], el["size"]) for el in elements]
+    ascent = np.fromiter((e[0] for e in estensioni), np.float64, n_el)
+    descent = np.fromiter((e[1] for e in estensioni), np.float64, n_el)
+    titolo = np.fromiter((el.get("is_title", False) for el in elements), bool, n_el)
+    fisso = np.fromiter((el.get("no_recenter", False) for el in elements), bool, n_el)
+    sx = np.fromiter((el["side"] == "left" for el in elements), bool, n_el)
+    dx = np.fromiter((el["side"] == "right" for el in elements), bool, n_el)
+    # Margine sicuro con estensione verticale COMPLETA
+    safe_left, safe_right = margini_per_estensione(y_el, ascent, descent)
+
+    if traccia:
+        log.debug("  Controllo finale ASSOLUTO (%d elementi):", n_el)
+    sx &= ~titolo
+    dx &= ~titolo
+    x_prima = x
+    # Sinistra: 1) non sovrapporre decorazioni, 2) non superare la piega
+    x_sx = np.maximum(x, safe_left)
+    x_sx = np.where(x_sx + tw > P2_LEFT_MAX_X, P2_LEFT_MAX_X - tw, x_sx)
+    # Destra: 1) non sovrapporre decorazioni, 2) non superare la piega
+    x_dx = np.where(x + tw > safe_right, safe_right - tw, x)
+    x_dx = np.maximum(x_dx, P2_RIGHT_MIN_X)
+    x = np.where(sx, x_sx, np.where(dx, x_dx, x))
+    # VERIFICA POST-FIX: ancora in zona?
+    errore = ((sx & ((x < safe_left) | (x + tw > P2_LEFT_MAX_X)))
+              | (dx & ((x + tw > safe_right) | (x < P2_RIGHT_MIN_X))))
+    corretto = np.abs(x - x_prima) > 0.5
+
+    esiti = []
+    errors = []
+    for i, el in enumerate(elements):
+        el["x"] = float(x[i])
+        esito = "abort" if errore[i] else "fix" if corretto[i] else "ok"
+        esiti.append({"label": el["label"], "esito": esito, "y": el["y"],
+                      "x_prima": float(x_prima[i]), "x": el["x"],
+                      "x_fine": el["x"] + el["tw"]})
+        if errore[i]:
+            errors.append(el)
+        if traccia:
+            if corretto[i]:
+                log.debug("    [FIX] %s: y=%.0f x %.0f->%.0f [%.0f..%.0f]", el["label"], el["y"],
+                          x_prima[i], el["x"], el["x"], el["x"] + el["tw"])
+            else:
+                log.debug("    [OK]  %s: y=%.0f [%.0f..%.0f]", el["label"], el["y"],
+                          el["x"], el["x"] + el["tw"])
+    fixes = int(corretto.sum())
 
-    c1.save()
+    if errors:
+        log.debug("  >>> %d elementi impossibili da posizionare", len(errors))
+        return esiti, len(errors), 0
+    elif fixes:
+        log.debug("  >>> %d elementi corretti", fixes)
+    else:
+        log.debug("  >>> Nessuna sovrapposizione")
 
-    # ── OVERLAY PAGINA 2 — titoli + piatti + vini ──
-    # Architettura: raccogli → verifica → disegna
-    # Tutti gli elementi testuali vengono raccolti con le posizioni iniziali,
-    # poi un controllo finale obbligatorio verifica e corregge eventuali
-    # sovrapposizioni con le zone proibite, e infine disegna tutto.
-    buf2 = io.BytesIO()
-    c2 = Canvas(buf2, pagesize=(pw, ph))
+    # ── CENTRATURA RIGHE INDIPENDENTI ──
+    # Ogni riga viene centrata sull'asse della colonna indipendentemente.
+    # Se la decorazione impedisce la centratura perfetta, la riga viene
+    # spostata solo quanto basta. Non c'è un centro comune per blocco.
+    # (Il CONTROLLO FINALE sopra ha già spostato le righe che sforano,
+    #  qui ricentro quelle che possono stare più vicine all'asse.)
+    centra = ~titolo & ~fisso
+    x_sx = np.maximum(P2_LEFT_CENTER_X - tw / 2, safe_left)
+    x_sx = np.where(x_sx + tw > P2_LEFT_MAX_X, P2_LEFT_MAX_X - tw, x_sx)
+    x_dx = np.minimum(P2_RIGHT_CENTER_X - tw / 2, safe_right - tw)
+    x_dx = np.maximum(x_dx, P2_RIGHT_MIN_X)
+    nuova_x = np.where(sx, x_sx, x_dx)
+    ricentra = centra & (np.abs(nuova_x - x) > 0.5)
+    for i in np.flatnonzero(ricentra):
+        elements[i]["x"] = float(nuova_x[i])
+    recenter_fixes = int(ricentra.sum())
 
-    elements = []    # [{text, x, y, font, size, color, alpha, tw, side, label}]
-    separators = []  # [{x, y, w, h}]
+    if recenter_fixes:
+        log.debug("  Centratura righe: %d righe ricentrate", recenter_fixes)
+    return esiti, 0, recenter_fixes
 
-    # ── Titolo menu (metà SX) — verde salvia 60% ──
-    # Titolo dal DB (menu_degustazione.nome), fallback per "carta"
-    if tipo_menu == "carta":
-        title_raw = MENU_TITLE_CARTA
-        title_text = title_raw.get(lingua, title_raw["it"])
-    else:
-        title_text = menu_nomi_db.get(tipo_menu, tipo_menu.capitalize())
-    menu_sz = MENU_TITLE_SIZE
-    title_tw = pdfmetrics.stringWidth(title_text, "Bellevue", menu_sz)
-    if title_tw > TITLE_MAX_W:
-        menu_sz = MENU_TITLE_SIZE * TITLE_MAX_W / title_tw
-        title_tw = pdfmetrics.stringWidth(title_text, "Bellevue", menu_sz)
-        print(f"  Titolo menu ridotto: {MENU_TITLE_SIZE}pt -> {menu_sz:.1f}pt "
-              f"(tw={title_tw:.0f}pt <= {TITLE_MAX_W:.0f}pt)")
-    elements.append({
-        "text": title_text, "x": P2_LEFT_CENTER_X - title_tw / 2,
-        "y": P2_TITLE_Y, "font": "Bellevue", "size": menu_sz,
-        "color": CLR_MENU_TITLE, "alpha": MENU_TITLE_OPACITY,
-        "tw": title_tw, "side": "left", "label": "titolo menu",
-        "is_title": True,
-    })
+
+@lru_cache(maxsize=32)
+def _layout_destra(lingua, team):
+    traccia = log.isEnabledFor(logging.DEBUG)
+    elements = []
 
     # ── Titolo vini (metà DX) — viola scuro 60% ──
     wine_title = WINE_TITLES.get(lingua, WINE_TITLES["en"])
@@ -838,16 +1458,16 @@ def genera_souvenir(data_val, tavolo, ospite, lingua, tipo_menu,
                     segs.append((part, "Bellevue", sz))
             return segs
         seg_list = _build_wine_segs(wine_sz)
-        total_w = sum(pdfmetrics.stringWidth(s, f, sz) for s, f, sz in seg_list)
+        total_w = sum(larghezza(s, f, sz) for s, f, sz in seg_list)
         if total_w > TITLE_MAX_W:
             wine_sz = WINE_TITLE_SIZE * TITLE_MAX_W / total_w
             seg_list = _build_wine_segs(wine_sz)
-            total_w = sum(pdfmetrics.stringWidth(s, f, sz) for s, f, sz in seg_list)
-            print(f"  Titolo vini ridotto: {WINE_TITLE_SIZE}pt -> {wine_sz:.1f}pt "
-                  f"(tw={total_w:.0f}pt <= {TITLE_MAX_W:.0f}pt)")
+            total_w = sum(larghezza(s, f, sz) for s, f, sz in seg_list)
+            log.debug("  Titolo vini ridotto: %spt -> %.1fpt (tw=%.0fpt <= %.0fpt)",
+                      WINE_TITLE_SIZE, wine_sz, total_w, TITLE_MAX_W)
         x_seg = P2_RIGHT_CENTER_X - total_w / 2
         for seg_text, seg_font, seg_size in seg_list:
-            seg_tw = pdfmetrics.stringWidth(seg_text, seg_font, seg_size)
+            seg_tw = larghezza(seg_text, seg_font, seg_size)
             elements.append({
                 "text": seg_text, "x": x_seg, "y": P2_TITLE_Y,
                 "font": seg_font, "size": seg_size, "color": CLR_WINE_TITLE,
@@ -856,12 +1476,12 @@ def genera_souvenir(data_val, tavolo, ospite, lingua, tipo_menu,
             })
             x_seg += seg_tw
     else:
-        wine_tw = pdfmetrics.stringWidth(wine_title, "Bellevue", wine_sz)
+        wine_tw = larghezza(wine_title, "Bellevue", wine_sz)
         if wine_tw > TITLE_MAX_W:
             wine_sz = WINE_TITLE_SIZE * TITLE_MAX_W / wine_tw
-            wine_tw = pdfmetrics.stringWidth(wine_title, "Bellevue", wine_sz)
-            print(f"  Titolo vini ridotto: {WINE_TITLE_SIZE}pt -> {wine_sz:.1f}pt "
-                  f"(tw={wine_tw:.0f}pt <= {TITLE_MAX_W:.0f}pt)")
+            wine_tw = larghezza(wine_title, "Bellevue", wine_sz)
+            log.debug("  Titolo vini ridotto: %spt -> %.1fpt (tw=%.0fpt <= %.0fpt)",
+                      WINE_TITLE_SIZE, wine_sz, wine_tw, TITLE_MAX_W)
         elements.append({
             "text": wine_title, "x": P2_RIGHT_CENTER_X - wine_tw / 2,
             "y": P2_TITLE_Y, "font": "Bellevue", "size": wine_sz,
@@ -870,79 +1490,6 @@ def genera_souvenir(data_val, tavolo, ospite, lingua, tipo_menu,
             "is_title": True,
         })
 
-    # ── PIATTI — metà sinistra ──
-    avail_width = half - 30
-
-    dish_blocks = []
-    for pid in piatti_ids:
-        dish = find_dish(pid)
-        if not dish:
-            print(f"  [!] '{pid}' non trovato nel database")
-            continue
-        nome, desc = get_dish_name_desc(dish, lingua)
-        if mostra_prezzo and dish.get("prezzo_carta"):
-            desc = f"{desc}  —  {dish['prezzo_carta']} €" if desc else f"{dish['prezzo_carta']} €"
-        dish_blocks.append(make_text_block(nome, desc, avail_width))
-
-    N = len(dish_blocks)
-
-    # Posizionamento piatti — logica adattiva
-    total_available = P2_DISHES_START_Y - P2_DISHES_END_Y
-    total_content = sum(b["block_h"] for b in dish_blocks)
-    gap_count = N - 1 if N > 1 else 1
-
-    # Gap naturale: distribuisci lo spazio disponibile tra i piatti
-    # Cap massimo a 70pt (~25mm) per non esagerare con pochi piatti
-    natural_gap = (total_available - total_content) / gap_count if gap_count > 0 else 0
-    gap_height = min(70, natural_gap)
-
-    # Centra il gruppo leggermente sopra il centro visivo (40/60)
-    group_h = total_content + (gap_count * gap_height if N > 1 else 0)
-    remaining = total_available - group_h
-    y_top = P2_DISHES_START_Y - remaining * 0.40
-    y_top = min(y_top, P2_DISHES_START_Y)
-    _position_blocks_from_y(dish_blocks, gap_height, y_top, P2_DISHES_END_Y)
-
-    # Re-wrap iterativo: ri-splitta SOLO se il testo non entra nello
-    # spazio fisico tra decorazione e piega (fit_w). Non re-wrappare
-    # per centratura: il RIALLINEAMENTO BLOCCHI gestisce lo spostamento.
-    for _iter in range(3):
-        rewrapped = False
-        for b in dish_blocks:
-            margin = find_block_tightest_margin(b, get_left_safe_margin, "left")
-            fit_w = P2_LEFT_MAX_X - margin
-            if fit_w <= 0:
-                continue
-            too_wide = any(
-                pdfmetrics.stringWidth(l, "BernhardMod", SZ_DISH_NAME) > fit_w
-                for l in b["name_lines"]
-            ) or any(
-                pdfmetrics.stringWidth(l, "BernhardMod-It", SZ_DESC) > fit_w
-                for l in b["desc_lines"]
-            )
-            if too_wide and rewrap_block(b, fit_w, simpleSplit):
-                rewrapped = True
-        if not rewrapped:
-            break
-        # Riposiziona dopo re-wrap
-        total_content = sum(b["block_h"] for b in dish_blocks)
-        natural_gap = (total_available - total_content) / gap_count if gap_count > 0 else 0
-        gap_height = min(70, natural_gap)
-        group_h = total_content + (gap_count * gap_height if N > 1 else 0)
-        remaining = total_available - group_h
-        y_top = P2_DISHES_START_Y - remaining * 0.40
-        y_top = min(y_top, P2_DISHES_START_Y)
-        _position_blocks_from_y(dish_blocks, gap_height, y_top, P2_DISHES_END_Y)
-
-    dish_mode = f"gap={gap_height:.0f}pt, {N} piatti"
-    print(f"  Piatti: {N} blocchi ({dish_mode}), gap={gap_height:.1f}pt")
-
-    # Raccogli elementi piatti + separatori
-    elements.extend(collect_block_elements(
-        dish_blocks, P2_LEFT_CENTER_X, "left", "piatto"))
-    separators.extend(place_block_separators(
-        dish_blocks, P2_LEFT_CENTER_X, "left"))
-
     # ── RIGHE PER SCRITTURA — metà destra ──
     # Linee rosse orizzontali spaziate 8mm per scrittura a mano
     RULED_LINE_SPACING = 22.68  # 8mm in punti (8 * 2.835)
@@ -953,12 +1500,10 @@ def genera_souvenir(data_val, tavolo, ospite, lingua, tipo_menu,
     ruled_lines = []
     y = ruled_y_start
     while y >= ruled_y_end:
-        # Rispetta decorazioni destra
-        yi = int(max(0, min(len(_RIGHT_DECO_PROFILE) - 1, y)))
-        safe_right = _RIGHT_DECO_PROFILE[yi]
-        if safe_right < 841:
-            safe_right -= SAFETY
-        else:
+        # Rispetta decorazioni destra su tutto lo spessore della riga
+        safe_right = margine_dx_intervallo(int(y - RULED_LINE_WIDTH / 2),
+                                           int(y + RULED_LINE_WIDTH / 2))
+        if safe_right is None:
             safe_right = pw - 15
         x1 = half + 15
         x2 = safe_right
@@ -966,13 +1511,13 @@ def genera_souvenir(data_val, tavolo, ospite, lingua, tipo_menu,
             ruled_lines.append({"x1": x1, "x2": x2, "y": y})
         y -= RULED_LINE_SPACING
 
-    print(f"  Righe scrittura: {len(ruled_lines)} linee (8mm, "
-          f"y={ruled_y_start:.0f}..{ruled_y_end:.0f})")
+    log.debug("  Righe scrittura: %d linee (8mm, y=%.0f..%.0f)",
+              len(ruled_lines), ruled_y_start, ruled_y_end)
 
     # ── Firme team — metà destra, sotto le righe ──
     # Legge DIRETTAMENTE dal DB, zero hardcoding, zero matching per ruolo.
     # Ogni membro del team ha la sua firma: nome + ruolo dal DB.
-    team_members_sig = db.get("team", [])
+    team_members_sig = [{"nome": nome, "ruolo": ruolo} for nome, ruolo in team]
     n_sigs = len(team_members_sig)
 
     if n_sigs > 0:
@@ -991,14 +1536,14 @@ def genera_souvenir(data_val, tavolo, ospite, lingua, tipo_menu,
                 frac = 0.10 + 0.80 * i / (n_sigs - 1)
             cx = sig_left_limit + sig_span * frac
 
-            tw = pdfmetrics.stringWidth(nome, "BernhardMod-It", SZ_DESC)
+            tw = larghezza(nome, "BernhardMod-It", SZ_DESC)
             elements.append({
                 "text": nome, "x": cx - tw / 2, "y": sig_name_y,
                 "font": "BernhardMod-It", "size": SZ_DESC,
                 "color": CLR_DESC, "alpha": 1.0, "tw": tw,
                 "side": "right", "label": f"firma {i} nome", "no_recenter": True,
             })
-            tw = pdfmetrics.stringWidth(ruolo, "BernhardMod-It", SZ_DESC)
+            tw = larghezza(ruolo, "BernhardMod-It", SZ_DESC)
             elements.append({
                 "text": ruolo, "x": cx - tw / 2, "y": sig_title_y,
                 "font": "BernhardMod-It", "size": SZ_DESC,
@@ -1006,109 +1551,119 @@ def genera_souvenir(data_val, tavolo, ospite, lingua, tipo_menu,
                 "side": "right", "label": f"firma {i} titolo", "no_recenter": True,
             })
 
-    # ══════════════════════════════════════════════════════════════
-    # CONTROLLO FINALE ASSOLUTO
-    # Verifica OGNI elemento con l'intera estensione verticale del testo
-    # (baseline ± ascent/descent). Se dopo la correzione il testo è ancora
-    # dentro una zona proibita → ABORT: il PDF NON viene generato.
-    # ══════════════════════════════════════════════════════════════
-    print(f"  Controllo finale ASSOLUTO ({len(elements)} elementi):")
-    fixes = 0
-    errors = []
-    for el in elements:
-        old_x = el["x"]
-        tw = el["tw"]
-        y_el = el["y"]
-        is_title = el.get("is_title", False)
-
-        if is_title:
-            pass  # Titoli decorativi: posizione centrata, nessun vincolo
-
-        elif el["side"] == "left":
-            # Margine sicuro con estensione verticale COMPLETA
-            safe_left = get_safe_margin_for_extent(
-                y_el, el["font"], el["size"], "left")
-            # 1) Non sovrapporre decorazioni a sinistra
-            if el["x"] < safe_left:
-                el["x"] = safe_left
-            # 2) Non superare la piega a destra
-            if el["x"] + tw > P2_LEFT_MAX_X:
-                el["x"] = P2_LEFT_MAX_X - tw
-            # VERIFICA POST-FIX: ancora in zona?
-            if el["x"] < safe_left or el["x"] + tw > P2_LEFT_MAX_X:
-                errors.append(el)
-
-        elif el["side"] == "right":
-            # Margine sicuro con estensione verticale COMPLETA
-            safe_right = get_safe_margin_for_extent(
-                y_el, el["font"], el["size"], "right")
-            # 1) Non sovrapporre decorazioni a destra
-            if el["x"] + tw > safe_right:
-                el["x"] = safe_right - tw
-            # 2) Non superare la piega a sinistra
-            if el["x"] < P2_RIGHT_MIN_X:
-                el["x"] = P2_RIGHT_MIN_X
-            # VERIFICA POST-FIX: ancora in zona?
-            if el["x"] + tw > safe_right or el["x"] < P2_RIGHT_MIN_X:
-                errors.append(el)
-
-        if abs(el["x"] - old_x) > 0.5:
-            fixes += 1
-            print(f"    [FIX] {el['label']}: y={y_el:.0f} "
-                  f"x {old_x:.0f}->{el['x']:.0f} "
-                  f"[{el['x']:.0f}..{el['x']+tw:.0f}]")
-        else:
-            print(f"    [OK]  {el['label']}: y={y_el:.0f} "
-                  f"[{el['x']:.0f}..{el['x']+tw:.0f}]")
+    esiti, errori, ricentrate = _verifica_elementi(elements, traccia)
+    return {"elements": elements, "ruled_lines": ruled_lines, "esiti": esiti,
+            "errori": errori, "ricentrate": ricentrate,
+            "titolo": wine_sz / WINE_TITLE_SIZE,
+            "form": "PaginaDestra" + impronta_dati([lingua, team])[:16]}
+
+def pagina2_destra(lingua, team_members):
+    """Metà destra di pagina 2 — titolo vini, righe per scrittura, firme —
+    uguale per tutti gli ospiti con la stessa lingua e lo stesso team:
+    layout e controllo finale calcolati una volta, disegnati come un unico
+    Form XObject per documento. Le firme restano al corpo pieno delle
+    descrizioni (SZ_DESC) anche quando l'auto-fit riduce i piatti.
+    Ritorna {elements, ruled_lines, esiti, errori, ricentrate, titolo, form}."""
+    team = tuple((m.get("nome", ""), m.get("ruolo", "")) for m in team_members)
+    return _layout_destra(lingua, team)
+
+def _layout_pagina2(ospite, lingua, tipo_menu, piatti_ids, menu_nomi_db,
+                    team_members, mostra_prezzo=False, report=None, avvisi=True,
+                    scala=1.0):
+    """Layout pagina 2: titolo menu e piatti, con controllo zone proibite,
+    più la metà destra condivisa (pagina2_destra).
+
+    Ritorna {elements, separators, destra} con posizioni verificate,
+    None se un elemento è impossibile da posizionare (abort).
+    Se `report` è un dict, vi registra piatti non trovati, diagnostica del
+    risolutore ed esito del controllo finale per elemento e per separatore
+    (anche in caso di abort). Avvisi ed errori sul layout finale li scrive
+    _layout_adattato; con `avvisi` False tace anche sui piatti non trovati.
+    `scala` riduce corpi, interlinee e gap dei soli piatti (auto-fit)."""
+    if report is None:
+        report = {}
+    traccia = log.isEnabledFor(logging.DEBUG)  # report testuale solo se richiesto
+    # Architettura: raccogli → verifica → disegna
+    # Tutti gli elementi testuali vengono raccolti con le posizioni iniziali,
+    # poi un controllo finale obbligatorio verifica e corregge eventuali
+    # sovrapposizioni con le zone proibite, e infine disegna tutto.
+    elements = []    # [{text, x, y, font, size, color, alpha, tw, side, label}]
+    separators = []  # [{x, y, w, h}]
 
-    if errors:
-        print(f"\n  [ERRORE CRITICO] {len(errors)} elementi impossibili da posizionare:")
-        for el in errors:
-            print(f"    ABORT: {el['label']} a y={el['y']:.0f} "
-                  f"[{el['x']:.0f}..{el['x']+el['tw']:.0f}]")
-        print(f"  >>> PDF NON generato per {ospite}")
-        return
-    elif fixes:
-        print(f"  >>> {fixes} elementi corretti")
+    # ── Titolo menu (metà SX) — verde salvia 60% ──
+    # Titolo dal DB (menu_degustazione.nome), fallback per "carta"
+    if tipo_menu == "carta":
+        title_raw = MENU_TITLE_CARTA
+        title_text = title_raw.get(lingua, title_raw["it"])
     else:
-        print(f"  >>> Nessuna sovrapposizione")
+        title_text = menu_nomi_db.get(tipo_menu, tipo_menu.capitalize())
+    menu_sz = MENU_TITLE_SIZE
+    title_tw = larghezza(title_text, "Bellevue", menu_sz)
+    if title_tw > TITLE_MAX_W:
+        menu_sz = MENU_TITLE_SIZE * TITLE_MAX_W / title_tw
+        title_tw = larghezza(title_text, "Bellevue", menu_sz)
+        log.debug("  Titolo menu ridotto: %spt -> %.1fpt (tw=%.0fpt <= %.0fpt)",
+                  MENU_TITLE_SIZE, menu_sz, title_tw, TITLE_MAX_W)
+    elements.append({
+        "text": title_text, "x": P2_LEFT_CENTER_X - title_tw / 2,
+        "y": P2_TITLE_Y, "font": "Bellevue", "size": menu_sz,
+        "color": CLR_MENU_TITLE, "alpha": MENU_TITLE_OPACITY,
+        "tw": title_tw, "side": "left", "label": "titolo menu",
+        "is_title": True,
+    })
 
-    # ── CENTRATURA RIGHE INDIPENDENTI ──
-    # Ogni riga viene centrata sull'asse della colonna indipendentemente.
-    # Se la decorazione impedisce la centratura perfetta, la riga viene
-    # spostata solo quanto basta. Non c'è un centro comune per blocco.
-    # (Il CONTROLLO FINALE sopra ha già spostato le righe che sforano,
-    #  qui ricentro quelle che possono stare più vicine all'asse.)
-    recenter_fixes = 0
-    for el in elements:
-        if el.get("is_title") or el.get("no_recenter"):
+    # ── Metà destra: titolo vini, righe, firme (condivisa tra ospiti) ──
+    destra = pagina2_destra(lingua, team_members)
+
+    # Fattori di riduzione dei titoli (1.0 = corpo pieno)
+    report["titoli"] = {"menu": menu_sz / MENU_TITLE_SIZE, "vini": destra["titolo"]}
+
+    # ── PIATTI — metà sinistra ──
+    avail_width = half - 30
+
+    m = metriche_piatti(scala)
+    dish_blocks = []
+    report["non_trovati"] = non_trovati = []
+    for pid in piatti_ids:
+        dish = find_dish(pid)
+        if not dish:
+            non_trovati.append(pid)
+            if avvisi:
+                log.warning("  [!] '%s' non trovato nel database", pid)
             continue
-        tw = el["tw"]
-        side = el["side"]
-        if side == "left":
-            ideal_x = P2_LEFT_CENTER_X - tw / 2
-            safe_left = get_safe_margin_for_extent(
-                el["y"], el["font"], el["size"], "left")
-            new_x = max(ideal_x, safe_left)
-            if new_x + tw > P2_LEFT_MAX_X:
-                new_x = P2_LEFT_MAX_X - tw
-        else:
-            ideal_x = P2_RIGHT_CENTER_X - tw / 2
-            safe_right = get_safe_margin_for_extent(
-                el["y"], el["font"], el["size"], "right")
-            new_x = min(ideal_x, safe_right - tw)
-            if new_x < P2_RIGHT_MIN_X:
-                new_x = P2_RIGHT_MIN_X
-        if abs(new_x - el["x"]) > 0.5:
-            recenter_fixes += 1
-            el["x"] = new_x
+        nome, desc = get_dish_name_desc(dish, lingua)
+        if mostra_prezzo and dish.get("prezzo_carta"):
+            desc = f"{desc}  —  {dish['prezzo_carta']} €" if desc else f"{dish['prezzo_carta']} €"
+        dish_blocks.append(make_text_block(nome, desc, avail_width, m))
 
-    if recenter_fixes:
-        print(f"  Centratura righe: {recenter_fixes} righe ricentrate")
+    N = len(dish_blocks)
+
+    # Posizionamento piatti e re-wrap risolti insieme (convergenza garantita)
+    gap_height, iterazioni, senza_spazio = risolvi_piatti(dish_blocks, m)
+    report["risolutore"] = {"iterazioni": iterazioni, "gap": gap_height,
+                            "senza_spazio": senza_spazio}
+
+    dish_mode = f"gap={gap_height:.0f}pt, {N} piatti"
+    log.debug("  Piatti: %d blocchi (%s), gap=%.1fpt", N, dish_mode, gap_height)
+
+    # Raccogli elementi piatti + separatori
+    elements.extend(collect_block_elements(
+        dish_blocks, P2_LEFT_CENTER_X, "left", "piatto", m))
+    separators.extend(place_block_separators(
+        dish_blocks, P2_LEFT_CENTER_X, "left", m))
+
+    # Controllo finale e centratura (la metà destra è già verificata)
+    esiti, errori, ricentrate = _verifica_elementi(elements, traccia)
+    report["elementi"] = esiti + destra["esiti"]
+    if errori or destra["errori"]:
+        return None
+    report["ricentrate"] = ricentrate + destra["ricentrate"]
 
     # ── CONTROLLO SEPARATORI CONTRO DECORAZIONI ──
     # I separatori (righe rosse) vengono verificati e ridotti se necessario.
-    print(f"  Controllo separatori ({len(separators)}):")
+    if traccia:
+        log.debug("  Controllo separatori (%d):", len(separators))
+    report["separatori"] = esiti_sep = []
     sep_fixes = 0
     valid_separators = []
     for si, sep in enumerate(separators):
@@ -1116,131 +1671,619 @@ def genera_souvenir(data_val, tavolo, ospite, lingua, tipo_menu,
         old_w = sep["w"]
         side = sep.get("side", "left")
         sep_y_lo = int(max(0, sep["y"] - 1))
-        sep_y_hi = int(min(len(_LEFT_DECO_PROFILE) - 1, sep["y"] + sep["h"] + 1))
+        sep_y_hi = int(sep["y"] + sep["h"] + 1)
 
         if side == "left":
             # Margine sinistro più restrittivo nell'area del separatore
-            safe_left = 0
-            for yi in range(sep_y_lo, sep_y_hi + 1):
-                deco = _LEFT_DECO_PROFILE[yi]
-                if deco > 0:
-                    safe_left = max(safe_left, deco + SAFETY)
+            safe_left = margine_sx_intervallo(sep_y_lo, sep_y_hi)
             new_x = max(sep["x"], safe_left)
             new_right = min(sep["x"] + sep["w"], P2_LEFT_MAX_X)
         else:
             # Margine destro più restrittivo nell'area del separatore
-            safe_right = pw
-            for yi in range(sep_y_lo, sep_y_hi + 1):
-                if yi < len(_RIGHT_DECO_PROFILE):
-                    deco = _RIGHT_DECO_PROFILE[yi]
-                    if deco < 841:
-                        safe_right = min(safe_right, deco - SAFETY)
+            safe_right = margine_dx_intervallo(sep_y_lo, sep_y_hi)
+            if safe_right is None:
+                safe_right = pw
             new_x = max(sep["x"], P2_RIGHT_MIN_X)
             new_right = min(sep["x"] + sep["w"], safe_right)
 
         new_w = new_right - new_x
+        esito = {"n": si + 1, "esito": "ok", "y": sep["y"],
+                 "x_prima": old_x, "x": new_x, "w_prima": old_w, "w": new_w}
+        esiti_sep.append(esito)
         if new_w < 30:
-            print(f"    [SKIP] sep {si+1}: y={sep['y']:.0f} troppo stretto ({new_w:.0f}pt)")
+            esito["esito"] = "skip"
+            if traccia:
+                log.debug("    [SKIP] sep %d: y=%.0f troppo stretto (%.0fpt)", si + 1, sep["y"], new_w)
             continue
 
         if abs(new_x - old_x) > 0.5 or abs(new_w - old_w) > 0.5:
+            esito["esito"] = "fix"
             sep_fixes += 1
             sep["x"] = new_x
             sep["w"] = new_w
-            sep["h"] = new_w / SEP_ASPECT
-            print(f"    [FIX] sep {si+1}: y={sep['y']:.0f} "
-                  f"x {old_x:.0f}->{new_x:.0f} w {old_w:.0f}->{new_w:.0f}")
+            sep["h"] = new_w / aspetto_separatore()
+            if traccia:
+                log.debug("    [FIX] sep %d: y=%.0f x %.0f->%.0f w %.0f->%.0f",
+                          si + 1, sep["y"], old_x, new_x, old_w, new_w)
         else:
-            print(f"    [OK]  sep {si+1}: y={sep['y']:.0f} "
-                  f"[{sep['x']:.0f}..{sep['x']+sep['w']:.0f}]")
+            esito["x"], esito["w"] = sep["x"], sep["w"]
+            if traccia:
+                log.debug("    [OK]  sep %d: y=%.0f [%.0f..%.0f]",
+                          si + 1, sep["y"], sep["x"], sep["x"] + sep["w"])
         valid_separators.append(sep)
 
     separators = valid_separators
     if sep_fixes:
-        print(f"  >>> {sep_fixes} separatori corretti")
-
-    # ══════════════════════════════════════════════════════════════
-    # DISEGNO — tutte le posizioni sono state verificate
-    # ══════════════════════════════════════════════════════════════
+        log.debug("  >>> %d separatori corretti", sep_fixes)
+
+    return {"elements": elements, "separators": separators, "destra": destra}
+
+# ── Memo layout pagina 2 ──
+# Tutti gli ospiti con lo stesso menu, piatti, lingua e prezzi hanno la
+# stessa pagina 2: il layout (e il suo report) si calcola una volta sola.
+LAYOUT_MEMO_MAX = 256
+_LAYOUT_MEMO = OrderedDict()  # chiave -> (layout, voci di report)
+_LOCK_MEMO = threading.Lock()  # sessioni Streamlit concorrenti nello stesso processo
+_REPORT_PAGINA2 = ("titoli", "non_trovati", "risolutore", "elementi", "ricentrate",
+                   "separatori", "scala_piatti")
+
+def _layout_adattato(ospite, lingua, tipo_menu, piatti_ids, menu_nomi_db,
+                     team_members, mostra_prezzo, report):
+    """_layout_pagina2 con auto-fit. Se a corpo pieno il layout va in abort
+    (e AUTOFIT è attivo) cerca per bisezione la scala più grande, fino ai
+    corpi minimi, con cui il controllo zone passa; la scala usata finisce
+    in report["scala_piatti"]. Registra avvisi ed errori del layout finale."""
+    args = (ospite, lingua, tipo_menu, piatti_ids, menu_nomi_db, team_members,
+            mostra_prezzo)
+    layout = _layout_pagina2(*args, report=report)
+    scala = 1.0
+    if layout is None and AUTOFIT:
+        def prova(s):
+            r = {}
+            return _layout_pagina2(*args, report=r, avvisi=False, scala=s), r
+
+        scala_min = max(AUTOFIT_SZ_MIN_NOME / SZ_DISH_NAME, AUTOFIT_SZ_MIN_DESC / SZ_DESC)
+        l_min, r_min = prova(scala_min)
+        if l_min is not None:
+            migliore = (scala_min, l_min, r_min)
+            basso, alto = scala_min, 1.0
+            for _ in range(AUTOFIT_PASSI):
+                s = (basso + alto) / 2
+                l, r = prova(s)
+                if l is None:
+                    alto = s
+                else:
+                    basso, migliore = s, (s, l, r)
+            scala, layout, r = migliore
+            report.update(r)
+            log.info("  Auto-fit: piatti al %.0f%% (nomi %.1fpt, descrizioni %.1fpt)",
+                     scala * 100, SZ_DISH_NAME * scala, SZ_DESC * scala)
+    report["scala_piatti"] = scala
+
+    risolutore = report["risolutore"]
+    for d in risolutore["senza_spazio"]:
+        log.warning("  [!] Piatto '%s' a y=%.0f: riga di %.0fpt in %.0fpt disponibili",
+                    d["nome"], d["y"], d["larghezza"], d["spazio"])
+    if risolutore["gap"] < 0:
+        log.warning("  [!] Piatti più alti dello spazio: gap %.0fpt", risolutore["gap"])
+    if layout is None:
+        errors = [e for e in report["elementi"] if e["esito"] == "abort"]
+        log.error("  [ERRORE CRITICO] %d elementi impossibili da posizionare:", len(errors))
+        for e in errors:
+            log.error("    ABORT: %s a y=%.0f [%.0f..%.0f]", e["label"], e["y"], e["x"], e["x_fine"])
+        log.error("  >>> PDF NON generato per %s", ospite)
+    return layout
+
+def layout_pagina2(ospite, lingua, tipo_menu, piatti_ids, menu_nomi_db,
+                   team_members, mostra_prezzo=False, report=None):
+    """_layout_pagina2 memorizzato per (tipo_menu, piatti, lingua, prezzi,
+    versione DB): menu_nomi_db e team_members vengono dal DB, quindi sono
+    coperti dalla sua versione. Gli abort non vengono memorizzati.
+    Il layout ritornato è condiviso: va solo letto."""
+    if report is None:
+        report = {}
+    chiave = (tipo_menu, tuple(piatti_ids), lingua, bool(mostra_prezzo), versione_db())
+    with _LOCK_MEMO:
+        trovato = _LAYOUT_MEMO.get(chiave)
+        if trovato is not None:
+            _LAYOUT_MEMO.move_to_end(chiave)
+    if trovato is not None:
+        layout, voci = trovato
+        report.update({k: list(v) if isinstance(v, list) else v for k, v in voci.items()})
+        log.debug("  Layout pagina 2 già calcolato (%s, %s, %d piatti)",
+                  tipo_menu, lingua, len(piatti_ids))
+        return layout
+    layout = _layout_adattato(ospite, lingua, tipo_menu, piatti_ids, menu_nomi_db,
+                              team_members, mostra_prezzo, report)
+    if layout is not None:
+        with _LOCK_MEMO:
+            _LAYOUT_MEMO[chiave] = (layout, {k: report[k] for k in _REPORT_PAGINA2})
+            while len(_LAYOUT_MEMO) > LAYOUT_MEMO_MAX:
+                _LAYOUT_MEMO.popitem(last=False)
+    return layout
+
+def _disegna_elementi(c, elements):
     for el in elements:
         if el["alpha"] < 1.0:
-            c2.saveState()
-            c2.setFillAlpha(el["alpha"])
-        c2.setFont(el["font"], el["size"])
-        c2.setFillColorRGB(*el["color"])
-        c2.drawString(el["x"], el["y"], el["text"])
+            c.saveState()
+            c.setFillAlpha(el["alpha"])
+        c.setFont(el["font"], el["size"])
+        c.setFillColorRGB(*el["color"])
+        c.drawString(el["x"], el["y"], el["text"])
         if el["alpha"] < 1.0:
-            c2.restoreState()
+            c.restoreState()
+
+def _disegna_pagina2(c, layout):
+    """Overlay pagina 2 — tutte le posizioni sono già state verificate.
+    La metà destra è un form creato al primo uso nel documento di `c`."""
+    _disegna_elementi(c, layout["elements"])
+
+    for sep in layout["separators"]:
+        disegna_separatore(c, sep["x"], sep["y"], sep["w"], sep["h"])
+
+    destra = layout["destra"]
+    nome = destra["form"]
+    if not c._doc.hasForm(nome):
+        c.beginForm(nome)
+        _disegna_elementi(c, destra["elements"])
+        # Righe per scrittura a mano
+        c.setStrokeColorRGB(247/255, 195/255, 211/255)
+        c.setLineWidth(RULED_LINE_WIDTH)
+        for rl in destra["ruled_lines"]:
+            c.line(rl["x1"], rl["y"], rl["x2"], rl["y"])
+        c.endForm()
+    c.doForm(nome)
+
+# ══════════════════════════════════════════════════════════════
+# FUNZIONE PRINCIPALE: genera un PDF souvenir per un ospite
+# ══════════════════════════════════════════════════════════════
+
+def _prepara_ospite(data_val, tavolo, ospite, lingua, tipo_menu, piatti_csv,
+                    numero_ospite=None, mostra_prezzo=False, report=None):
+    """Risolve l'ordine dal DB e calcola i layout delle due pagine.
+    Ritorna il dict da passare a _disegna_ospite, None se abort."""
+    if report is None:
+        report = {}
+    dt = parse_date(data_val)
+    lingua = str(lingua).strip().lower()
+    date_text = format_date(dt, lingua)
+    tipo_menu = str(tipo_menu).strip().lower()
+    # Composizione menu degustazione: leggi piatti_ids e nome dal DB
+    db = get_db()
+    menu_piatti_db = {}
+    menu_nomi_db = {}
+    for m in db.get("menu_degustazione", []):
+        if m.get("piatti_ids"):
+            menu_piatti_db[m["id"]] = m["piatti_ids"]
+        if m.get("nome"):
+            menu_nomi_db[m["id"]] = m["nome"]
+
+    if tipo_menu in menu_piatti_db:
+        piatti_ids = menu_piatti_db[tipo_menu]
+    elif tipo_menu != "carta":
+        log.warning("  [!] Menu '%s' non ha piatti_ids nel database — PDF senza piatti", tipo_menu)
+        piatti_ids = []
+    else:
+        # Carta: leggi dal campo piatti dell'Excel/UI
+        piatti_ids = [p.strip() for p in str(piatti_csv).split(",") if p.strip()]
+
+    log.info("Ospite: %s | Tavolo: %s | Lingua: %s | Menu: %s",
+             ospite, tavolo, lingua, tipo_menu)
+
+    pagina1 = copertina(lingua, date_text, db.get("team", []))
+    report["copertina"] = pagina1["esiti"]
+    layout = layout_pagina2(ospite, lingua, tipo_menu, piatti_ids, menu_nomi_db,
+                            db.get("team", []), mostra_prezzo, report)
+    if layout is None:
+        return None
+    return {"pagina1": pagina1, "tavolo": tavolo, "numero_ospite": numero_ospite,
+            "layout": layout}
+
+def _disegna_ospite(sfondo, prep):
+    """Disegna le due pagine di un ospite preparato: sfondo condiviso
+    (Form XObject) e overlay nello stesso passaggio sul canvas di `sfondo`."""
+    c = sfondo.canvas
+    sfondo.disegna(0)
+    _disegna_pagina1(c, prep["pagina1"], prep["tavolo"], prep["numero_ospite"])
+    c.showPage()
+    sfondo.disegna(1)
+    _disegna_pagina2(c, prep["layout"])
+    c.showPage()
+
+def _salva(c, buf, output_path):
+    """Chiude il canvas e (opzionale) scrive il PDF su disco. Ritorna i bytes."""
+    c.save()
+    pdf_bytes = buf.getvalue()
+    if output_path is not None:
+        _scrivi(pdf_bytes, output_path)
+    return pdf_bytes
 
-    for sep in separators:
-        c2.drawImage(SEP_READER, sep["x"], sep["y"],
-                     width=sep["w"], height=sep["h"], mask="auto")
+# ══════════════════════════════════════════════════════════════
+# CACHE PDF — input identici → stesso PDF, senza rigenerare
+# In memoria (LRU) sempre; su disco in output/.cache/ se abilitata
+# (CLI --cache, oppure CACHE.cartella = CACHE_DIR).
+# ══════════════════════════════════════════════════════════════
+CACHE_DIR = OUTPUT_DIR / ".cache"
+CACHE = CacheSouvenir()
+# Moduli da cui dipende il PDF (anche quelli importati al primo uso):
+# la loro impronta entra nella chiave di cache
+MODULI_RENDER = [Path(__file__)] + [
+    Path(__file__).with_name(m) for m in
+    ("sfondo.py", "misure_testo.py", "profili_deco.py", "zone_sfondo.py",
+     "cache_souvenir.py")]
+
+def chiave_souvenir(data_val, tavolo, lingua, tipo_menu, piatti_csv,
+                    numero_ospite=None, mostra_prezzo=False, variante="stampa"):
+    """Chiave di cache: hash di tutto ciò che finisce nel PDF.
+
+    Include le versioni di DB, sfondo, separatore e codice, così ogni
+    modifica invalida da sola le voci vecchie. Nome ospite e tavolo non
+    sono stampati (il tavolo solo con numero_ospite): ospiti con lo stesso
+    ordine condividono la voce."""
+    tipo_menu = str(tipo_menu).strip().lower()
+    piatti = ([p.strip() for p in str(piatti_csv or "").split(",") if p.strip()]
+              if tipo_menu == "carta" else None)
+    return impronta_dati({
+        "data": parse_date(data_val).date().isoformat(),
+        "lingua": str(lingua).strip().lower(),
+        "tipo_menu": tipo_menu,
+        "piatti": piatti,
+        "mostra_prezzo": bool(mostra_prezzo),
+        "etichetta": (None if numero_ospite is None
+                      else f"{tavolo} - {numero_ospite}"),
+        "variante": variante,
+        "autofit": [AUTOFIT, AUTOFIT_SZ_MIN_NOME, AUTOFIT_SZ_MIN_DESC],
+        "db": versione_db(),
+        "sfondo": impronta_file(risolvi_variante(SFONDO, variante)),
+        "separatore": impronta_file(SEP_SRC),
+        "codice": [impronta_file(m) for m in MODULI_RENDER],
+    })
 
-    # Righe per scrittura a mano
-    c2.setStrokeColorRGB(247/255, 195/255, 211/255)
-    c2.setLineWidth(0.75)
-    for rl in ruled_lines:
-        c2.line(rl["x1"], rl["y"], rl["x2"], rl["y"])
+def _scrivi(pdf_bytes, output_path):
+    """Scrive il PDF su disco (crea la cartella se serve)."""
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "wb") as f:
+        f.write(pdf_bytes)
+
+def genera_souvenir(data_val, tavolo, ospite, lingua, tipo_menu,
+                    piatti_csv, tipo_vini="", vini_raw="", output_path=None,
+                    numero_ospite=None, mostra_prezzo=False,
+                    sfondo_condiviso=None, variante="stampa", usa_cache=True,
+                    report=None):
+    """Genera un PDF souvenir per un singolo ospite.
+
+    `variante`: sfondo "stampa" (piena risoluzione) o "anteprima" (leggero,
+    per email/anteprima) — vedi scripts/ottimizza_sfondo.py.
+    Con `sfondo_condiviso` (SfondoCondiviso) le due pagine vengono aggiunte
+    al documento condiviso, che riusa lo stesso sfondo per tutti gli ospiti:
+    nessun file scritto, ritorna True (None se il PDF non è generabile).
+    Con `usa_cache` un ordine già generato viene servito da CACHE.
+    `report`: dict opzionale, riempito con ospite, esito ("ok", "abort",
+    "cache") e l'esito del controllo finale per elemento e separatore.
+    """
+    prepara()
+    if report is not None:
+        report.update(ospite=ospite, tavolo=tavolo, numero_ospite=numero_ospite)
+    chiave = None
+    if sfondo_condiviso is None and usa_cache:
+        chiave = chiave_souvenir(data_val, tavolo, lingua, tipo_menu, piatti_csv,
+                                 numero_ospite, mostra_prezzo, variante)
+        pdf_bytes = CACHE.get(chiave)
+        if pdf_bytes is not None:
+            log.info("Ospite: %s | Tavolo: %s | dalla cache", ospite, tavolo)
+            if report is not None:
+                report["esito"] = "cache"
+            if output_path is not None:
+                _scrivi(pdf_bytes, output_path)
+                log.info("  -> %s", Path(output_path).name)
+            return pdf_bytes
+
+    prep = _prepara_ospite(data_val, tavolo, ospite, lingua, tipo_menu, piatti_csv,
+                           numero_ospite, mostra_prezzo, report)
+    if report is not None:
+        report["esito"] = "ok" if prep is not None else "abort"
+    if prep is None:
+        return
 
-    c2.save()
+    if sfondo_condiviso is not None:
+        _disegna_ospite(sfondo_condiviso, prep)
+        return True
 
-    # ── ASSEMBLAGGIO ──
-    bg = PdfReader(str(SFONDO))
-    writer = PdfWriter()
+    # Passaggio unico: sfondo + overlay sullo stesso canvas, un solo salvataggio
+    buf = io.BytesIO()
+    c = Canvas(buf, pagesize=(pw, ph))
+    _disegna_ospite(SfondoCondiviso(c, risolvi_variante(SFONDO, variante)), prep)
+    pdf_bytes = _salva(c, buf, output_path)
+    if chiave is not None:
+        CACHE.put(chiave, pdf_bytes)
+    if output_path is not None:
+        log.info("  -> %s", Path(output_path).name)
+    return pdf_bytes
 
-    p1 = bg.pages[0]
-    p1.merge_page(PdfReader(buf1).pages[0])
-    writer.add_page(p1)
 
-    p2 = bg.pages[1]
-    p2.merge_page(PdfReader(buf2).pages[0])
-    writer.add_page(p2)
+def genera_serata(ordini, output_path=None, variante="stampa", report=None):
+    """Genera un unico PDF per tutta la serata ("night book").
 
-    pdf_buf = io.BytesIO()
-    writer.write(pdf_buf)
-    pdf_bytes = pdf_buf.getvalue()
+    `ordini`: lista di dict con gli argomenti di genera_souvenir (data_val,
+    tavolo, ospite, lingua, tipo_menu, piatti_csv, numero_ospite,
+    mostra_prezzo). Due pagine per ospite, nell'ordine ricevuto.
+    Sfondo (nella `variante` scelta), font e separatore sono oggetti unici
+    condivisi da tutte le pagine.
+    Ritorna (pdf_bytes, esclusi): esclusi = indici degli ordini non generati.
+    `report`: lista opzionale, riceve il report di ogni ordine (vedi genera_souvenir).
+    """
+    prepara()
+    buf = io.BytesIO()
+    c = Canvas(buf, pagesize=(pw, ph))
+    sfondo = SfondoCondiviso(c, risolvi_variante(SFONDO, variante))
+    esclusi = []
+    n_ok = 0
+    for idx, o in enumerate(ordini):
+        r = {} if report is not None else None
+        ok = genera_souvenir(
+            o["data_val"], o["tavolo"], o["ospite"], o["lingua"], o["tipo_menu"],
+            o.get("piatti_csv", ""), numero_ospite=o.get("numero_ospite"),
+            mostra_prezzo=o.get("mostra_prezzo", False), sfondo_condiviso=sfondo,
+            report=r)
+        if report is not None:
+            report.append(r)
+        if not ok:
+            esclusi.append(idx)
+            continue
+        n_ok += 1
+    if n_ok == 0:
+        return None, esclusi
 
+    pdf_bytes = _salva(c, buf, output_path)
     if output_path is not None:
-        output_path = Path(output_path)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_path, "wb") as f:
-            f.write(pdf_bytes)
-        print(f"  -> {output_path.name}")
+        log.info("Serata: %d ospiti, %d pagine -> %s", n_ok, 2 * n_ok, Path(output_path).name)
+    return pdf_bytes, esclusi
+
+def preflight(ordini):
+    """Verifica di layout di una serata senza generare PDF.
+
+    Per ogni ordine (dict come per genera_serata) risolve il DB, costruisce
+    i blocchi, li posiziona ed esegue i controlli zone di entrambe le
+    pagine — nessun canvas, nessun PDF. Ritorna un report per ordine, come
+    quello di genera_souvenir (esito "ok"/"abort", titoli, non_trovati,
+    scala_piatti, elementi, ...), più i riassunti:
+      correzioni: etichette degli elementi spostati dal controllo finale
+      abort:      etichette degli elementi impossibili da posizionare
+    I layout calcolati restano nella memo: il rendering successivo li riusa."""
+    prepara()
+    reports = []
+    for o in ordini:
+        r = {"ospite": o["ospite"], "tavolo": o["tavolo"],
+             "numero_ospite": o.get("numero_ospite")}
+        prep = _prepara_ospite(
+            o["data_val"], o["tavolo"], o["ospite"], o["lingua"], o["tipo_menu"],
+            o.get("piatti_csv", ""), o.get("numero_ospite"),
+            o.get("mostra_prezzo", False), r)
+        r["esito"] = "ok" if prep is not None else "abort"
+        elementi = r.get("elementi", [])
+        r["correzioni"] = [e["label"] for e in elementi if e["esito"] == "fix"]
+        r["abort"] = [e["label"] for e in elementi if e["esito"] == "abort"]
+        reports.append(r)
+    return reports
 
-    return pdf_bytes
+# ══════════════════════════════════════════════════════════════
+# GENERAZIONE PARALLELA — ordini distribuiti su più processi
+# ══════════════════════════════════════════════════════════════
+
+def _inizializza_worker(variante, cartella_cache, livello_log):
+    """Pre-riscaldamento del worker: font, separatore, sfondo della variante
+    e cache su disco — pronti prima del primo ordine. Il log del worker non
+    va a console: viene raccolto per ordine (vedi _genera_ordine)."""
+    log.setLevel(livello_log)
+    log.propagate = False
+    prepara(separatore_incluso=True)
+    carica_sfondo(risolvi_variante(SFONDO, variante))
+    CACHE.cartella = cartella_cache
+
+def _usa_db(versione, db):
+    """Allinea il DB del worker a quello del processo principale
+    (ricaricato solo quando la versione cambia)."""
+    global _DB_VERSIONE
+    if versione != _DB_VERSIONE:
+        set_db(db)
+        _DB_VERSIONE = versione
+
+def _genera_ordine(indice, ordine, variante, db):
+    """Genera un ordine dentro il worker. Il log viene raccolto e restituito,
+    così il processo principale lo stampa nell'ordine giusto."""
+    testo = io.StringIO()
+    handler = logging.StreamHandler(testo)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(handler)
+    hit = CACHE.hit
+    output_path = ordine.get("output_path")
+    report = {}
+    try:
+        _usa_db(*db)
+        pdf_bytes = genera_souvenir(
+            ordine["data_val"], ordine["tavolo"], ordine["ospite"],
+            ordine["lingua"], ordine["tipo_menu"], ordine.get("piatti_csv", ""),
+            output_path=output_path, numero_ospite=ordine.get("numero_ospite"),
+            mostra_prezzo=ordine.get("mostra_prezzo", False), variante=variante,
+            report=report)
+        errore = None if pdf_bytes is not None else "PDF non generabile"
+    except Exception as e:
+        pdf_bytes, errore = None, f"{type(e).__name__}: {e}"
+    finally:
+        log.removeHandler(handler)
+    return {
+        "indice": indice,
+        "ok": errore is None,
+        "errore": errore,
+        "pdf": pdf_bytes if output_path is None else None,  # su disco: non serve rimandarlo
+        "cache": CACHE.hit > hit,
+        "report": report,
+        "log": testo.getvalue(),
+    }
+
+def crea_pool(jobs=None, variante="stampa", mp_context=None):
+    """Pool di processi pre-riscaldati (default: un processo per core).
+    Riutilizzabile tra più chiamate a genera_parallelo, es. nell'app."""
+    return ProcessPoolExecutor(max_workers=jobs or os.cpu_count() or 1,
+                               mp_context=mp_context,
+                               initializer=_inizializza_worker,
+                               initargs=(variante, CACHE.cartella,
+                                         log.getEffectiveLevel()))
+
+def genera_parallelo(ordini, jobs=None, variante="stampa", pool=None):
+    """Genera gli `ordini` su più processi: `pool` (da crea_pool) se dato,
+    altrimenti un pool di `jobs` processi creato e chiuso qui.
+
+    `ordini`: dict come per genera_serata, più `output_path` opzionale
+    (se presente il worker scrive il file e non rimanda i bytes).
+    Il DB corrente viaggia con ogni ordine, quindi un pool persistente
+    segue le modifiche al menu.
+    Generatore: produce un esito per ordine appena il worker lo completa
+    (ordine di completamento; `esito["indice"]` = posizione in `ordini`).
+    Un ordine fallito non interrompe gli altri: ok=False ed errore."""
+    if not ordini:
+        return
+    db = (versione_db(), get_db())
+    proprio = pool is None
+    if proprio:
+        pool = crea_pool(max(1, min(jobs or os.cpu_count() or 1, len(ordini))), variante)
+    try:
+        futures = [pool.submit(_genera_ordine, i, o, variante, db)
+                   for i, o in enumerate(ordini)]
+        for fut in as_completed(futures):
+            yield fut.result()
+    finally:
+        if proprio:
+            pool.shutdown(cancel_futures=True)
 
 # ══════════════════════════════════════════════════════════════
 # MAIN: lettura Excel e generazione PDF
 # ══════════════════════════════════════════════════════════════
 
 if __name__ == "__main__":
+    import argparse
+    import openpyxl
+    parser = argparse.ArgumentParser(description="Genera i souvenir dal file Excel in input/")
+    parser.add_argument("--serata", action="store_true",
+                        help="un unico PDF per tutta la serata (stampa unica)")
+    parser.add_argument("--variante", choices=list(VARIANTI), default="stampa",
+                        help="sfondo per stampa o leggero per email/anteprima")
+    parser.add_argument("--cache", action="store_true",
+                        help=f"riusa i PDF già generati (salvati in {CACHE_DIR.relative_to(ROOT)}/)")
+    parser.add_argument("--jobs", "-j", type=int, default=1, metavar="N",
+                        help="genera su N processi in parallelo (0 = uno per core)")
+    parser.add_argument("--report", type=Path, metavar="FILE",
+                        help="salva in JSON l'esito del controllo finale per ogni ospite")
+    parser.add_argument("--preflight", action="store_true",
+                        help="solo verifica del layout, senza generare PDF")
+    verbosita = parser.add_mutually_exclusive_group()
+    verbosita.add_argument("-v", "--verbose", action="store_true",
+                           help="report dettagliato per elemento e separatore")
+    verbosita.add_argument("-q", "--quiet", action="store_true",
+                           help="solo avvisi, errori e riepilogo finale")
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.WARNING if args.quiet else logging.INFO,
+        format="%(message)s", stream=sys.stdout)
+    if args.cache:
+        CACHE.cartella = CACHE_DIR
+
     xlsx_files = sorted(INPUT_DIR.glob("*.xlsx"))
     if not xlsx_files:
-        print("\n[ERRORE] Nessun file .xlsx trovato in input/")
+        log.error("[ERRORE] Nessun file .xlsx trovato in input/")
         sys.exit(1)
 
     xlsx_path = xlsx_files[0]
-    print(f"\nLettura ordini: {xlsx_path.name}")
+    log.info("Lettura ordini: %s", xlsx_path.name)
 
     wb_xl = openpyxl.load_workbook(xlsx_path, data_only=True)
     ws = wb_xl["ORDINI"]
 
-    count = 0
+    ordini = []
     for row in ws.iter_rows(min_row=2, values_only=True):
         if not row[0]:
             continue
         data_val, tavolo, ospite, lingua, tipo_menu, piatti, tipo_vini, vini = row
+        ordine = dict(data_val=data_val, tavolo=tavolo, ospite=ospite,
+                      lingua=lingua, tipo_menu=tipo_menu, piatti_csv=piatti,
+                      tipo_vini=tipo_vini, vini_raw=vini)
+        if not args.serata:
+            # Nome file: souvenir_DDMMYYYY_tavolo_ospite.pdf
+            date_file = parse_date(data_val).strftime("%d%m%Y")
+            fname = f"souvenir_{date_file}_{safe_filename(tavolo)}_{safe_filename(ospite)}.pdf"
+            ordine["output_path"] = OUTPUT_DIR / fname
+        ordini.append(ordine)
 
-        # Nome file: souvenir_DDMMYYYY_tavolo_ospite.pdf
-        dt = parse_date(data_val)
-        date_file = dt.strftime("%d%m%Y")
-        fname = f"souvenir_{date_file}_{safe_filename(tavolo)}_{safe_filename(ospite)}.pdf"
-        out_path = OUTPUT_DIR / fname
+    wb_xl.close()
 
-        genera_souvenir(data_val, tavolo, ospite, lingua, tipo_menu,
-                        piatti, tipo_vini, vini, out_path)
-        count += 1
+    t0 = time.perf_counter()
+    if args.preflight:
+        reports = preflight(ordini)
+        if args.report:
+            args.report.parent.mkdir(parents=True, exist_ok=True)
+            with open(args.report, "w", encoding="utf-8") as f:
+                json.dump(reports, f, ensure_ascii=False, indent=1, default=str)
+        print(f"\n{'='*60}")
+        n_ok = sum(r["esito"] == "ok" for r in reports)
+        print(f"Preflight: {n_ok}/{len(reports)} layout validi "
+              f"({(time.perf_counter() - t0) * 1000:.0f}ms)")
+        for r in reports:
+            note = []
+            if r["non_trovati"]:
+                note.append(f"piatti non trovati: {', '.join(r['non_trovati'])}")
+            if r["scala_piatti"] < 1:
+                note.append(f"piatti al {r['scala_piatti']:.0%}")
+            note += [f"titolo {k} al {v:.0%}" for k, v in r["titoli"].items() if v < 1]
+            if r["abort"]:
+                note.append(f"ABORT: {', '.join(r['abort'])}")
+            if note:
+                print(f"  [!] {r['tavolo']} - {r['ospite']}: {'; '.join(note)}")
+        sys.exit(0 if n_ok == len(reports) else 1)
+
+    esclusi = []  # (ordine, motivo)
+    reports = []  # un report per ordine, nell'ordine del foglio
+    if args.serata and ordini:
+        # Nome file: serata_DDMMYYYY.pdf (data della prima riga)
+        date_file = parse_date(ordini[0]["data_val"]).strftime("%d%m%Y")
+        _, idx_esclusi = genera_serata(ordini, OUTPUT_DIR / f"serata_{date_file}.pdf",
+                                       variante=args.variante, report=reports)
+        esclusi = [(ordini[idx], "PDF non generabile") for idx in idx_esclusi]
+    elif args.jobs != 1 and len(ordini) > 1:
+        jobs = max(1, min(args.jobs or os.cpu_count() or 1, len(ordini)))
+        log.info("Generazione su %d processi...", jobs)
+        # Log stampati nell'ordine del foglio, man mano che sono pronti
+        pronti, prossimo, n_cache = {}, 0, 0
+        for esito in genera_parallelo(ordini, jobs, args.variante):
+            pronti[esito["indice"]] = esito
+            while prossimo in pronti:
+                e = pronti.pop(prossimo)
+                sys.stdout.write(e["log"])
+                reports.append(e["report"])
+                if not e["ok"]:
+                    esclusi.append((ordini[prossimo], e["errore"]))
+                n_cache += e["cache"]
+                prossimo += 1
+        CACHE.hit += n_cache
+    else:
+        for o in ordini:
+            reports.append({})
+            if genera_souvenir(o["data_val"], o["tavolo"], o["ospite"], o["lingua"],
+                               o["tipo_menu"], o["piatti_csv"], o["tipo_vini"],
+                               o["vini_raw"], o["output_path"],
+                               variante=args.variante, report=reports[-1]) is None:
+                esclusi.append((o, "PDF non generabile"))
+    count = len(ordini) - len(esclusi)
+
+    if args.report:
+        args.report.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=1, default=str)
 
-    wb_xl.close()
     print(f"\n{'='*60}")
-    print(f"Completato: {count} PDF generati in {OUTPUT_DIR}")
+    print(f"Completato: {count} souvenir generati in {OUTPUT_DIR} "
+          f"({time.perf_counter() - t0:.1f}s)")
+    for o, motivo in esclusi:
+        print(f"  [!] Escluso: {o['tavolo']} - {o['ospite']} ({motivo})")
+    if CACHE.hit:
+        print(f"  (dalla cache: {CACHE.hit})")
@@ -0,0 +1,94 @@
+"""
+misure_testo.py — Misura del testo per il layout dei souvenir.
+Per ogni font TTF registrato la tabella delle larghezze glifo (advance, in
+millesimi di em) viene costruita una volta; la larghezza di una stringa è un
+lookup vettoriale NumPy sui codepoint, memorizzato per (testo, font, corpo).
+Risultato identico bit a bit a pdfmetrics.stringWidth.
+"""
+
+from functools import lru_cache
+
+from reportlab.pdfbase import pdfmetrics
+
+
+@lru_cache(maxsize=None)
+def tabella_larghezze(font):
+    """Array NumPy codepoint → larghezza (1/1000 em) del font registrato.
+    L'ultima cella vale defaultWidth ed è usata per i codepoint fuori tabella.
+    None se il font non è un TTF o se le larghezze non sono sommabili in modo
+    esatto (in quel caso si usa pdfmetrics, per restare identici)."""
+    import numpy as np
+
+    face = getattr(pdfmetrics.getFont(font), "face", None)
+    if face is None or not hasattr(face, "charWidths"):
+        return None
+    tab = np.full(max(face.charWidths, default=0) + 2, face.defaultWidth, dtype=np.float64)
+    for cp, w in face.charWidths.items():
+        tab[cp] = w
+    # Larghezze con al più 16 bit frazionari (unitsPerEm 1000 o 2048):
+    # ogni somma parziale è esatta, quindi l'ordine di somma non conta.
+    if not np.all(np.mod(tab * 65536, 1) == 0) or tab.max() >= 2 ** 20:
+        return None
+    return tab
+
+
+@lru_cache(maxsize=16384)
+def unita(text, font):
+    """Larghezza di `text` in millesimi di em, somma esatta dalla tabella;
+    None se il font non ha una tabella esatta o il testo è troppo lungo."""
+    tab = tabella_larghezze(font)
+    if tab is None or len(text) > 4096:  # oltre, la somma non è più garantita esatta
+        return None
+    import numpy as np
+
+    cp = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    cp = np.minimum(cp, len(tab) - 1)
+    return float(tab[cp].sum())
+
+
+@lru_cache(maxsize=16384)
+def larghezza(text, font, size):
+    """Larghezza in pt di `text` nel `font` registrato a corpo `size`
+    (sostituto memorizzato di pdfmetrics.stringWidth)."""
+    u = unita(text, font)
+    if u is None:
+        return pdfmetrics.stringWidth(text, font, size)
+    return 0.001 * size * u
+
+
+class MisuraParole:
+    """Larghezze delle righe ' '.join(parole[l:i]) in O(1) ciascuna.
+
+    Somme cumulative delle larghezze delle parole (in millesimi di em) più
+    uno spazio per parola: essendo somme esatte, ogni riga misura quanto
+    larghezza() della riga ricomposta. Senza tabella esatta si ricade su
+    larghezza() della riga."""
+
+    def __init__(self, parole, font, size):
+        self.parole = list(parole)
+        self.font = font
+        self.size = size
+        spazio = unita(" ", font)
+        unita_parole = [unita(p, font) for p in self.parole]
+        self._esatta = spazio is not None and None not in unita_parole
+        if self._esatta:
+            self._spazio = spazio
+            self._cum = [0.0]
+            for u in unita_parole:
+                self._cum.append(self._cum[-1] + u + spazio)
+
+    def __len__(self):
+        return len(self.parole)
+
+    def __call__(self, l, i):
+        """Larghezza in pt della riga con le parole [l, i) (l < i)."""
+        if self._esatta:
+            return 0.001 * self.size * (self._cum[i] - self._cum[l] - self._spazio)
+        return larghezza(" ".join(self.parole[l:i]), self.font, self.size)
+
+
+@lru_cache(maxsize=1024)
+def misura_parole(text, font, size):
+    """MisuraParole delle parole di `text` (memorizzata: il re-wrap
+    rimisura lo stesso testo a larghezze diverse)."""
+    return MisuraParole(text.split(), font, size)
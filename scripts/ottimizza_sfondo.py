@@ -0,0 +1,102 @@
+"""
+ottimizza_sfondo.py — Build step: varianti ottimizzate degli sfondi del grafico.
+  assets/sfondo/Sfondo souvenir - stampa.pdf     → piena risoluzione (300 dpi)
+  assets/sfondo/Sfondo souvenir - anteprima.pdf  → leggera per email/anteprima
+  (idem per Riga rossa.pdf)
+Immagini ricampionate al DPI di destinazione e ricompresse, stream deflate,
+oggetti duplicati eliminati. Da rieseguire quando arriva un nuovo sfondo:
+genera_souvenir usa la variante solo se più recente dell'originale.
+"""
+
+import io
+import sys
+
+import fitz
+from PIL import Image
+
+from sfondo import ROOT, SFONDO, VARIANTI, percorso_variante
+
+SORGENTI = [SFONDO, ROOT / "Riga rossa.pdf"]
+
+
+def ricampiona_immagini(doc, dpi, qualita):
+    """Ricampiona ogni immagine a `dpi` (rispetto alla dimensione a cui è
+    disegnata) e la ricomprime in JPEG `qualita`. Le SMask seguono.
+    Un JPEG RGB già alla risoluzione giusta (o sotto) resta intatto:
+    ricomprimerlo perderebbe qualità senza ridurre nulla."""
+    fatte = set()
+    for page in doc:
+        for img in page.get_images(full=True):
+            xref, smask, w, h = img[0], img[1], img[2], img[3]
+            if xref in fatte:
+                continue
+            fatte.add(xref)
+            rects = page.get_image_rects(xref)
+            if not rects:
+                continue
+            nw = min(w, max(1, round(max(r.width for r in rects) / 72 * dpi)))
+            nh = min(h, max(1, round(max(r.height for r in rects) / 72 * dpi)))
+            if ((nw, nh) == (w, h) and img[8] == "DCTDecode"
+                    and doc.extract_image(xref)["colorspace"] == 3):
+                print(f"    immagine {xref}: {w}x{h} invariata (JPEG originale)")
+                continue
+
+            pix = fitz.Pixmap(doc, xref)
+            if pix.alpha:
+                pix = fitz.Pixmap(pix, 0)
+            cs_originale = pix.n == 3
+            if not cs_originale:
+                pix = fitz.Pixmap(fitz.csRGB, pix)
+            im = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+            if (nw, nh) != (w, h):
+                im = im.resize((nw, nh), Image.LANCZOS)
+            buf = io.BytesIO()
+            im.save(buf, format="JPEG", quality=qualita, optimize=True)
+            doc.update_stream(xref, buf.getvalue(), compress=False)
+            doc.xref_set_key(xref, "Filter", "/DCTDecode")
+            doc.xref_set_key(xref, "DecodeParms", "null")
+            doc.xref_set_key(xref, "Width", str(nw))
+            doc.xref_set_key(xref, "Height", str(nh))
+            doc.xref_set_key(xref, "BitsPerComponent", "8")
+            if not cs_originale:
+                doc.xref_set_key(xref, "ColorSpace", "/DeviceRGB")
+
+            if smask and (nw, nh) != (w, h):
+                mpix = fitz.Pixmap(doc, smask)
+                mask = Image.frombytes("L", (mpix.width, mpix.height), mpix.samples)
+                mask = mask.resize((nw, nh), Image.LANCZOS)
+                doc.update_stream(smask, mask.tobytes(), compress=True)
+                doc.xref_set_key(smask, "DecodeParms", "null")
+                doc.xref_set_key(smask, "Width", str(nw))
+                doc.xref_set_key(smask, "Height", str(nh))
+            print(f"    immagine {xref}: {w}x{h} -> {nw}x{nh} (JPEG q{qualita})")
+
+
+def salva(doc, path):
+    """Salva con garbage collection + deduplica oggetti e stream deflate.
+    Linearizzazione se supportata dalla versione di MuPDF installata."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    opts = dict(garbage=4, deflate=True, clean=True, use_objstms=1)
+    try:
+        doc.save(str(path), linear=True, **opts)
+    except (ValueError, RuntimeError):
+        # MuPDF >= 1.24 non linearizza più: salva senza
+        doc.save(str(path), **opts)
+
+
+def main():
+    for sorgente in SORGENTI:
+        print(f"Input: {sorgente.name} ({sorgente.stat().st_size / 1024:.0f} KB)")
+        for variante, cfg in VARIANTI.items():
+            doc = fitz.open(str(sorgente))
+            ricampiona_immagini(doc, cfg["dpi"], cfg["qualita"])
+            out = percorso_variante(sorgente, variante)
+            salva(doc, out)
+            doc.close()
+            print(f"  Salvato: {out.relative_to(ROOT)} "
+                  f"({out.stat().st_size / 1024:.0f} KB, {cfg['dpi']} dpi)")
+    print("Done!")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+profili_deco.py — Profili delle decorazioni laterali di pagina 2 dello sfondo.
+Rasterizza la pagina interna con PyMuPDF e ricava con NumPy, per ogni riga Y
+(coordinate reportlab, origine in basso) il bordo interno delle decorazioni:
+  sinistra[i] = x massima dell'inchiostro nella metà sinistra (0 = nessuna)
+  destra[i]   = x minima dell'inchiostro nella metà destra (larghezza = nessuna)
+con la riga i a Y = i * passo (passo < 1 → risoluzione sotto il punto).
+Il risultato è salvato accanto alle varianti (assets/sfondo/<nome> - profili.json)
+con l'hash dello sfondo: si ricalcola solo quando arriva uno sfondo nuovo.
+  python profili_deco.py ["Sfondo.pdf"] [--scala 4] [--passo 1] [--forza]
+"""
+
+import argparse
+import json
+import math
+import sys
+from pathlib import Path
+
+from cache_souvenir import impronta_file, sidecar
+from sfondo import SFONDO, VARIANTI_DIR
+
+PAGINA = 1    # pagina interna (0 = copertina)
+SCALA  = 4    # rasterizzazione 4x: un pixel = 0.25 pt
+SOGLIA = 25   # distanza colore dal bianco oltre cui il pixel è decorazione
+PASSO  = 1.0  # pt per riga del profilo
+
+
+def rasterizza_inchiostro(path, pagina=PAGINA, scala=SCALA, soglia=SOGLIA):
+    """Rendering della pagina `pagina` di `path` a `scala`x: ritorna
+    (maschera bool dei pixel decorati, righe dall'alto; larghezza pt; altezza pt)."""
+    import fitz
+    import numpy as np
+
+    doc = fitz.open(str(path))
+    page = doc[pagina]
+    larg, alt = page.rect.width, page.rect.height
+    pix = page.get_pixmap(matrix=fitz.Matrix(scala, scala), alpha=False)
+    doc.close()
+
+    rgb = np.frombuffer(pix.samples, dtype=np.uint8)
+    rgb = rgb.reshape(pix.height, pix.width, pix.n)[:, :, :3].astype(np.float32)
+    return np.sqrt(((255.0 - rgb) ** 2).sum(axis=2)) > soglia, larg, alt
+
+
+def estrai_profili(path, pagina=PAGINA, scala=SCALA, soglia=SOGLIA, passo=PASSO):
+    """Profili (sinistra, destra) della pagina `pagina` di `path`.
+
+    La riga i copre la fascia Y ± passo/2, allargata di un pixel per lato;
+    le x sono arrotondate per eccesso (sinistra) e per difetto (destra),
+    così il profilo non sottostima mai la decorazione."""
+    import numpy as np
+
+    inchiostro, larg, alt = rasterizza_inchiostro(path, pagina, scala, soglia)
+    altezza_px, larghezza_px = inchiostro.shape
+
+    # Bordo interno per riga di pixel (-1 / larghezza_px = nessun inchiostro)
+    meta = int(math.ceil(larg / 2 * scala))
+    col = np.arange(larghezza_px)
+    sx_px = np.where(inchiostro[:, :meta], col[:meta], -1).max(axis=1)
+    dx_px = np.where(inchiostro[:, meta:], col[meta:], larghezza_px).min(axis=1)
+
+    # Fascia di righe pixel [r0, r1) di ogni riga del profilo (pixel dall'alto)
+    y = np.arange(int(math.ceil(alt / passo)) + 1) * passo
+    margine = passo / 2 + 1 / scala
+    r0 = np.clip(np.floor((alt - y - margine) * scala), 0, altezza_px).astype(np.int64)
+    r1 = np.clip(np.ceil((alt - y + margine) * scala), 0, altezza_px).astype(np.int64)
+    vuota = r1 <= r0
+
+    # reduceat sulle coppie (r0, r1): i posti pari sono le fasce
+    idx = np.stack([np.minimum(r0, altezza_px), r1], axis=1).ravel()
+    sx = np.maximum.reduceat(np.append(sx_px, -1), idx)[::2]
+    dx = np.minimum.reduceat(np.append(dx_px, larghezza_px), idx)[::2]
+    sx[vuota] = -1
+    dx[vuota] = larghezza_px
+
+    nessuna_dx = int(larg)
+    sinistra = np.where(sx >= 0, np.ceil((sx + 1) / scala), 0)
+    destra = np.where(dx < larghezza_px, np.minimum(np.floor(dx / scala), nessuna_dx),
+                      nessuna_dx)
+    return sinistra.astype(int).tolist(), destra.astype(int).tolist()
+
+
+def percorso_profili(sorgente):
+    """File sidecar con i profili di `sorgente`."""
+    return VARIANTI_DIR / f"{Path(sorgente).stem} - profili.json"
+
+def profili_sfondo(sorgente=SFONDO, scala=SCALA, passo=PASSO, forza=False):
+    """Profili di `sorgente` dal file sidecar, se calcolati sullo stesso
+    sfondo (hash) con gli stessi parametri; altrimenti estratti e salvati.
+    Ritorna il dict {sha256, pagina, scala, soglia, passo, sinistra, destra}."""
+    path = percorso_profili(sorgente)
+    chiave = {"sha256": impronta_file(sorgente), "pagina": PAGINA,
+              "scala": scala, "soglia": SOGLIA, "passo": passo}
+
+    def carica(data):
+        dati = json.loads(data)
+        return dati if all(dati.get(k) == v for k, v in chiave.items()) else None
+
+    def costruisci():
+        sinistra, destra = estrai_profili(sorgente, PAGINA, scala, SOGLIA, passo)
+        return dict(chiave, sinistra=sinistra, destra=destra)
+
+    dati, _ = sidecar(path, carica, costruisci,
+                      lambda dati: json.dumps(dati).encode("utf-8"), forza)
+    return dati
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Estrae i profili delle decorazioni di pagina 2")
+    ap.add_argument("sfondo", nargs="?", default=str(SFONDO))
+    ap.add_argument("--scala", type=float, default=SCALA, help="rasterizzazione (default 4x)")
+    ap.add_argument("--passo", type=float, default=PASSO, help="pt per riga (default 1)")
+    ap.add_argument("--forza", action="store_true", help="ricalcola anche se in cache")
+    args = ap.parse_args()
+
+    dati = profili_sfondo(Path(args.sfondo), args.scala, args.passo, args.forza)
+    sx, dx = dati["sinistra"], dati["destra"]
+    print(f"Input: {Path(args.sfondo).name} (sha256 {dati['sha256'][:12]})")
+    print(f"  {len(sx)} righe da {dati['passo']:g} pt, scala {dati['scala']:g}x")
+    print(f"  sinistra: {sum(1 for v in sx if v > 0)} righe con decorazione, max x={max(sx)}")
+    print(f"  destra:   {sum(1 for v in dx if v < max(dx))} righe con decorazione, min x={min(dx)}")
+    print(f"  Salvato: {percorso_profili(args.sfondo)}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
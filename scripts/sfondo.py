@@ -0,0 +1,190 @@
+"""
+sfondo.py — Sfondo souvenir condiviso tra più pagine dello stesso documento.
+Lo sfondo viene analizzato UNA volta per processo (SfondoTemplate, in cache);
+ogni sua pagina viene poi copiata UNA volta nel documento reportlab di output
+come Form XObject: le pagine degli ospiti la richiamano con `Do` e disegnano
+il proprio overlay (testi, separatori, righe) nello stesso passaggio.
+"""
+
+import io
+from functools import lru_cache
+from pathlib import Path
+
+from pypdf import PdfReader
+from pypdf.generic import (
+    ArrayObject, DictionaryObject, IndirectObject, StreamObject,
+)
+from reportlab.pdfbase import pdfdoc
+
+ROOT   = Path(__file__).resolve().parent.parent
+SFONDO = ROOT / "Sfondo souvenir.pdf"
+
+# ── Varianti ottimizzate (generate da scripts/ottimizza_sfondo.py) ──
+# stampa:    piena risoluzione per la tipografia, JPEG ad alta qualità
+# anteprima: leggera per email/anteprima a schermo
+VARIANTI_DIR = ROOT / "assets" / "sfondo"
+VARIANTI = {
+    "stampa":    {"dpi": 300, "qualita": 90},
+    "anteprima": {"dpi": 110, "qualita": 75},
+}
+
+
+def percorso_variante(sorgente, variante):
+    """Percorso della variante `variante` del PDF `sorgente`."""
+    sorgente = Path(sorgente)
+    return VARIANTI_DIR / f"{sorgente.stem} - {variante}.pdf"
+
+def risolvi_variante(sorgente, variante="stampa"):
+    """Ritorna la variante ottimizzata se esiste ed è aggiornata rispetto
+    all'originale, altrimenti l'originale del grafico."""
+    if variante not in VARIANTI:
+        raise ValueError(f"Variante sfondo sconosciuta: {variante!r} "
+                         f"(attese: {', '.join(VARIANTI)})")
+    sorgente = Path(sorgente)
+    ottimizzato = percorso_variante(sorgente, variante)
+    if (ottimizzato.exists()
+            and ottimizzato.stat().st_mtime_ns >= sorgente.stat().st_mtime_ns):
+        return ottimizzato
+    return sorgente
+
+
+def _risolvi(obj, visti):
+    """Forza la lettura di tutti gli oggetti raggiungibili da `obj`,
+    così le copie successive non toccano più il parser."""
+    if isinstance(obj, IndirectObject):
+        if obj.idnum in visti:
+            return
+        visti.add(obj.idnum)
+        obj = obj.get_object()  # stream: dati letti ma non decompressi
+    if isinstance(obj, DictionaryObject):
+        for v in obj.values():
+            _risolvi(v, visti)
+    elif isinstance(obj, ArrayObject):
+        for v in obj:
+            _risolvi(v, visti)
+
+
+class SfondoTemplate:
+    """Sfondo analizzato una sola volta: pagine, contenuti e risorse in memoria.
+
+    Le pagine non vengono mai modificate (niente merge_page): ogni documento
+    ne ottiene una copia leggera tramite SfondoCondiviso, che condivide
+    i byte delle immagini invece di ricopiarli dal file.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.reader = PdfReader(str(self.path))
+        self.pagine = list(self.reader.pages)
+        self.contenuti = [p.get_contents().get_data() for p in self.pagine]
+        visti = set()
+        for p in self.pagine:
+            _risolvi(p.raw_get("/Resources"), visti)
+            if "/Group" in p:
+                _risolvi(p.raw_get("/Group"), visti)
+
+    @property
+    def larghezza(self):
+        return float(self.pagine[0].mediabox.width)
+
+    @property
+    def altezza(self):
+        return float(self.pagine[0].mediabox.height)
+
+
+@lru_cache(maxsize=4)
+def _carica_sfondo(path, mtime):
+    return SfondoTemplate(path)
+
+def carica_sfondo(path=SFONDO):
+    """Ritorna lo SfondoTemplate di `path`, analizzato una sola volta per
+    processo (ricaricato solo se il file cambia)."""
+    path = Path(path)
+    return _carica_sfondo(path, path.stat().st_mtime_ns)
+
+
+@lru_cache(maxsize=4)
+def _dimensioni(path, mtime):
+    box = PdfReader(str(path)).pages[0].mediabox
+    return float(box.width), float(box.height)
+
+def dimensioni_pagina(path=SFONDO):
+    """(larghezza, altezza) in pt della prima pagina: legge solo la MediaBox,
+    senza analizzare risorse e immagini come carica_sfondo."""
+    path = Path(path)
+    return _dimensioni(path, path.stat().st_mtime_ns)
+
+
+def _in_reportlab(doc, obj, cache):
+    """Traduce un oggetto pypdf in oggetto reportlab (pdfdoc) per `doc`.
+
+    Dizionari/array vengono ricostruiti, gli stream passano con i byte
+    grezzi e il loro /Filter originale (nessuna ricompressione), gli scalari
+    vengono serializzati da pypdf. Gli oggetti indiretti sono registrati
+    una sola volta per documento (cache per idnum)."""
+    if isinstance(obj, IndirectObject):
+        if obj.idnum not in cache:
+            target = obj.get_object()
+            rl = _in_reportlab(doc, target, cache)
+            if isinstance(target, (DictionaryObject, ArrayObject)):
+                rl = doc.Reference(rl)
+            cache[obj.idnum] = rl
+        return cache[obj.idnum]
+    if isinstance(obj, StreamObject):
+        d = pdfdoc.PDFDictionary({k[1:]: _in_reportlab(doc, v, cache)
+                                  for k, v in obj.items() if k != "/Length"})
+        return pdfdoc.PDFStream(d, obj._data)
+    if isinstance(obj, DictionaryObject):
+        return pdfdoc.PDFDictionary({k[1:]: _in_reportlab(doc, v, cache)
+                                     for k, v in obj.items()})
+    if isinstance(obj, ArrayObject):
+        return pdfdoc.PDFArray([_in_reportlab(doc, v, cache) for v in obj])
+    buf = io.BytesIO()
+    obj.write_to_stream(buf)
+    return buf.getvalue()
+
+
+class SfondoCondiviso:
+    """Sfondo registrato come Form XObject dentro un canvas reportlab.
+
+    Le immagini dello sfondo (~2.7 MB) vengono scritte una sola volta per
+    documento, indipendentemente dal numero di pagine che le usano.
+    Gli overlay si disegnano direttamente sullo stesso canvas: un solo
+    passaggio, nessun PDF intermedio da salvare, rileggere e fondere.
+    """
+
+    def __init__(self, canvas, sfondo=SFONDO):
+        self.canvas = canvas
+        self.template = (sfondo if isinstance(sfondo, SfondoTemplate)
+                         else carica_sfondo(sfondo))
+        self._forms = {}   # indice pagina sfondo -> nome form reportlab
+        self._oggetti = {}  # idnum pypdf -> oggetto reportlab (condivisi)
+
+    def form(self, indice):
+        """Ritorna il nome del Form XObject della pagina `indice`.
+        Creato al primo uso, poi riusato per tutte le pagine successive."""
+        if indice not in self._forms:
+            doc = self.canvas._doc
+            page = self.template.pagine[indice]
+            d = pdfdoc.PDFDictionary({
+                "Type": pdfdoc.PDFName("XObject"),
+                "Subtype": pdfdoc.PDFName("Form"),
+                "BBox": pdfdoc.PDFArray([0, 0, self.template.larghezza,
+                                         self.template.altezza]),
+                "Resources": _in_reportlab(doc, page.raw_get("/Resources"),
+                                           self._oggetti),
+            })
+            if "/Group" in page:
+                d["Group"] = _in_reportlab(doc, page.raw_get("/Group"), self._oggetti)
+            nome = f"SfondoSouvenir{indice}"
+            doc.Reference(pdfdoc.PDFStream(d, self.template.contenuti[indice]),
+                          doc.getXObjectName(nome))
+            self._forms[indice] = nome
+        return self._forms[indice]
+
+    def disegna(self, indice):
+        """Disegna la pagina `indice` dello sfondo sulla pagina corrente."""
+        nome = self.form(indice)
+        self.canvas.saveState()
+        self.canvas.doForm(nome)
+        self.canvas.restoreState()
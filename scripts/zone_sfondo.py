@@ -0,0 +1,144 @@
+"""
+zone_sfondo.py — Mappa 2D delle zone occupate dello sfondo, per entrambe le pagine.
+Ogni pagina è ridotta a una griglia di celle (default 1 pt): una cella è
+occupata se contiene almeno un pixel decorato del rendering 4x. Con l'immagine
+integrale della griglia "questo rettangolo è libero?" costa quattro lookup,
+qualunque sia la dimensione del rettangolo. Le griglie sono salvate accanto
+alle varianti (assets/sfondo/<nome> - zone-p<N>.npz), legate all'hash dello sfondo.
+  python zone_sfondo.py ["Sfondo.pdf"] [--cella 1] [--forza]
+"""
+
+import argparse
+import io
+import math
+import sys
+from pathlib import Path
+
+from cache_souvenir import impronta_file, sidecar
+from profili_deco import SCALA, SOGLIA, rasterizza_inchiostro
+from sfondo import SFONDO, VARIANTI_DIR
+
+CELLA = 1.0  # pt per cella della griglia
+
+
+class MappaOccupazione:
+    """Griglia di occupazione di una pagina con immagine integrale.
+
+    Coordinate reportlab (pt, origine in basso a sinistra); la riga 0 della
+    griglia è in basso. I rettangoli sono (x0, y0, x1, y1)."""
+
+    def __init__(self, occupato, cella, larghezza, altezza):
+        import numpy as np
+        self.occupato = np.asarray(occupato, dtype=bool)
+        self.cella = cella
+        self.larghezza = larghezza
+        self.altezza = altezza
+        righe, colonne = self.occupato.shape
+        self._integrale = np.zeros((righe + 1, colonne + 1), dtype=np.int32)
+        self._integrale[1:, 1:] = self.occupato.cumsum(axis=0).cumsum(axis=1)
+
+    def _celle(self, x0, y0, x1, y1, esterne=True):
+        """Celle [r0, r1) x [c0, c1) che toccano il rettangolo (o, con
+        `esterne` False, che vi sono interamente contenute)."""
+        arrot_giu, arrot_su = (math.floor, math.ceil) if esterne else (math.ceil, math.floor)
+        righe, colonne = self.occupato.shape
+        c0 = min(max(arrot_giu(x0 / self.cella), 0), colonne)
+        c1 = min(max(arrot_su(x1 / self.cella), 0), colonne)
+        r0 = min(max(arrot_giu(y0 / self.cella), 0), righe)
+        r1 = min(max(arrot_su(y1 / self.cella), 0), righe)
+        return r0, max(r1, r0), c0, max(c1, c0)
+
+    def conta(self, x0, y0, x1, y1):
+        """Numero di celle occupate che toccano il rettangolo (O(1))."""
+        r0, r1, c0, c1 = self._celle(x0, y0, x1, y1)
+        s = self._integrale
+        return int(s[r1, c1] - s[r0, c1] - s[r1, c0] + s[r0, c0])
+
+    def libero(self, x0, y0, x1, y1, margine=0.0):
+        """True se il rettangolo, allargato di `margine` pt, non tocca decorazioni."""
+        return self.conta(x0 - margine, y0 - margine, x1 + margine, y1 + margine) == 0
+
+    def senza(self, rettangoli):
+        """Nuova mappa con le celle interamente coperte da `rettangoli`
+        liberate (es. i rettangoli bianchi disegnati sopra lo sfondo)."""
+        occupato = self.occupato.copy()
+        for rect in rettangoli:
+            r0, r1, c0, c1 = self._celle(*rect, esterne=False)
+            occupato[r0:r1, c0:c1] = False
+        return MappaOccupazione(occupato, self.cella, self.larghezza, self.altezza)
+
+
+def estrai_occupazione(path, pagina, scala=SCALA, soglia=SOGLIA, cella=CELLA):
+    """Griglia bool (riga 0 in basso) delle celle con decorazioni della
+    pagina `pagina` di `path`. Ritorna (griglia, larghezza, altezza)."""
+    import numpy as np
+
+    inchiostro, larg, alt = rasterizza_inchiostro(path, pagina, scala, soglia)
+    blocco = max(1, round(cella * scala))  # pixel per lato di cella
+    righe = -(-inchiostro.shape[0] // blocco)
+    colonne = -(-inchiostro.shape[1] // blocco)
+    # Pixel dall'alto: la prima riga di celle (in basso) parte da `alt`,
+    # quindi il completamento a multipli di blocco va sopra
+    pad_alto = righe * blocco - inchiostro.shape[0]
+    pad_destra = colonne * blocco - inchiostro.shape[1]
+    griglia = np.pad(inchiostro, ((pad_alto, 0), (0, pad_destra)))
+    griglia = griglia.reshape(righe, blocco, colonne, blocco).any(axis=(1, 3))
+    return griglia[::-1], larg, alt
+
+
+def percorso_zone(sorgente, pagina):
+    """File sidecar con la griglia della pagina `pagina` di `sorgente`."""
+    return VARIANTI_DIR / f"{Path(sorgente).stem} - zone-p{pagina}.npz"
+
+def mappa_sfondo(sorgente=SFONDO, pagina=0, scala=SCALA, cella=CELLA, forza=False):
+    """MappaOccupazione della pagina `pagina` di `sorgente`, dal file sidecar
+    se calcolata sullo stesso sfondo (hash) con gli stessi parametri;
+    altrimenti estratta e salvata."""
+    import numpy as np
+
+    path = percorso_zone(sorgente, pagina)
+    chiave = [impronta_file(sorgente), str(pagina), str(scala), str(SOGLIA), str(cella)]
+
+    def carica(data):
+        with np.load(io.BytesIO(data)) as dati:
+            if dati["chiave"].tolist() != chiave:
+                return None
+            righe, colonne = dati["forma"].tolist()
+            occupato = np.unpackbits(dati["bit"])[:righe * colonne]
+            larg, alt = dati["pagina"].tolist()
+        return MappaOccupazione(occupato.reshape(righe, colonne).astype(bool),
+                                cella, larg, alt)
+
+    def costruisci():
+        griglia, larg, alt = estrai_occupazione(sorgente, pagina, scala, SOGLIA, cella)
+        return MappaOccupazione(griglia, cella, larg, alt)
+
+    def serializza(mappa):
+        buf = io.BytesIO()
+        np.savez_compressed(buf, chiave=np.array(chiave), forma=np.array(mappa.occupato.shape),
+                            pagina=np.array([mappa.larghezza, mappa.altezza]),
+                            bit=np.packbits(mappa.occupato))
+        return buf.getvalue()
+
+    mappa, _ = sidecar(path, carica, costruisci, serializza, forza)
+    return mappa
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Griglie di occupazione dello sfondo")
+    ap.add_argument("sfondo", nargs="?", default=str(SFONDO))
+    ap.add_argument("--cella", type=float, default=CELLA, help="pt per cella (default 1)")
+    ap.add_argument("--forza", action="store_true", help="ricalcola anche se in cache")
+    args = ap.parse_args()
+
+    print(f"Input: {Path(args.sfondo).name}")
+    for pagina in (0, 1):
+        mappa = mappa_sfondo(Path(args.sfondo), pagina, cella=args.cella, forza=args.forza)
+        righe, colonne = mappa.occupato.shape
+        print(f"  pagina {pagina + 1}: {colonne}x{righe} celle da {args.cella:g} pt, "
+              f"{mappa.occupato.mean():.0%} occupate")
+        print(f"  Salvato: {percorso_zone(args.sfondo, pagina)}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())